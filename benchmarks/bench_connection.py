@@ -0,0 +1,81 @@
+"""
+Compare ops/sec of the pooled per-thread connections of Database
+against opening a new connection for every call (and reading categories
+without the cache, as before it).
+
+Usage: python -m benchmarks.bench_connection [operations]
+"""
+
+import sys
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from bot.core.interfaces import Expense
+from bot.core.utils import time_now
+from bot.model import Database
+
+
+class OpenPerCallDatabase(Database):
+    """Database with the old behaviour: connect, commit and close on every call."""
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_COLNAMES)
+        conn.execute("PRAGMA foreign_keys = 1")
+        self._local.on_commit = []
+        try:
+            yield conn.cursor()
+        finally:
+            conn.commit()
+            conn.close()
+        for callback in self._local.on_commit:
+            callback()
+
+    def get_categories(self) -> list[str]:
+        # read from the database on every call
+        with self.connection() as cursor:
+            cursor.execute("SELECT * FROM categories")
+            return [row[0] for row in cursor.fetchall()]
+
+
+def ops_per_second(func, operations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(operations):
+        func()
+    return operations / (time.perf_counter() - start)
+
+
+def run(db: Database, operations: int) -> dict[str, float]:
+    db.create_schema()
+    db.migrate()
+    db.add_category("other")
+    db.add_category("food")
+    expense = Expense(10, "food", None, time_now())
+
+    results = {
+        "get_categories": ops_per_second(db.get_categories, operations),
+        "add_expense": ops_per_second(lambda: db.add_expense(expense), operations),
+        # uncached on both sides, rows of all added expenses
+        "expenses_in": ops_per_second(lambda: db.expenses_in(expense.time), operations // 10)
+    }
+    db.close()
+    return results
+
+
+def main() -> None:
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old = run(OpenPerCallDatabase(Path(tmp) / "old.db"), operations)
+        new = run(Database(Path(tmp) / "new.db"), operations)
+
+    print(f"{'operation':<16}{'open-per-call':>16}{'pooled':>16}{'speedup':>10}")
+    for name in old:
+        print(f"{name:<16}{old[name]:>16.0f}{new[name]:>16.0f}{new[name] / old[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
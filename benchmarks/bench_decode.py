@@ -0,0 +1,63 @@
+"""
+Compare rows/sec of decoding expenses into Expense objects: the old way
+(rows turned into lists, times parsed by strptime) against the DATE converter
+and the row factory of Database, on synthetic data (see benchmarks/synthetic.py).
+
+Usage: python -m benchmarks.bench_decode [years] [repeat]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bot.core.interfaces import Expense
+from bot.core.utils import time_from_str
+from bot.model import Database, EXPENSE_COLUMNS
+from benchmarks.synthetic import generate
+
+
+def decode_old(db: Database) -> list[Expense]:
+    with db.connection() as cursor:
+        cursor.execute("SELECT amount, category_name, description, time FROM expenses")
+        expenses = []
+        for result in [list(result) for result in cursor.fetchall()]:
+            if result[2] == "":
+                result[2] = None
+            result[3] = time_from_str(result[3])
+            expenses.append(Expense(*result))
+        return expenses
+
+
+def decode_new(db: Database) -> list[Expense]:
+    with db.connection() as cursor:
+        return db._fetch_expenses(cursor, f"SELECT {EXPENSE_COLUMNS} FROM expenses")
+
+
+def rows_per_second(func, db: Database, repeat: int) -> tuple[float, list[Expense]]:
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        expenses = func(db)
+        rows += len(expenses)
+    return rows / (time.perf_counter() - start), expenses
+
+
+def main() -> None:
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = generate(Path(tmp) / "data", years)
+        old, old_expenses = rows_per_second(decode_old, model.db, repeat)
+        new, new_expenses = rows_per_second(decode_new, model.db, repeat)
+        model.close()
+
+    assert old_expenses == new_expenses, "decoded expenses differ"
+    print(f"{len(new_expenses)} expenses")
+    print(f"{'strptime':<16}{old:>14.0f} rows/sec")
+    print(f"{'converter':<16}{new:>14.0f} rows/sec{new / old:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
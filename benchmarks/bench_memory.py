@@ -0,0 +1,75 @@
+"""
+Compare memory taken by expenses of a multi-year range loaded as a list of Expense objects
+(with and without __slots__) and as an ExpenseBatch, on synthetic data (see benchmarks/synthetic.py).
+
+Usage: python -m benchmarks.bench_memory [years]
+"""
+
+import sys
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from bot.model import Database, EXPENSE_COLUMNS
+from benchmarks.synthetic import END, generate
+
+
+@dataclass
+class DictExpense:
+    """Expense as it was before, with a __dict__ per instance."""
+
+    amount: float
+    category: str
+    description: str | None
+    time: datetime
+
+
+def load_expenses(db: Database, start: datetime) -> list:
+    with db.connection() as cursor:
+        return db._fetch_expenses(cursor, f"SELECT {EXPENSE_COLUMNS} FROM expenses WHERE time >= ?", (str(start),))
+
+
+def load_dict_expenses(db: Database, start: datetime) -> list:
+    return [DictExpense(e.amount, e.category, e.description, e.time) for e in load_expenses(db, start)]
+
+
+def load_batch(db: Database, start: datetime):
+    return db.expense_batch(start, END)
+
+
+def allocated(func, db: Database, start: datetime) -> tuple[int, object]:
+    """Bytes still allocated when func returns (taken by its result) and the result."""
+
+    tracemalloc.start()
+    result = func(db, start)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main() -> None:
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = generate(Path(tmp) / "data", years)
+        start = END.replace(year=END.year - years)
+        # warm up the page cache and connection, so they aren't counted
+        load_batch(model.db, start)
+
+        results = {}
+        for name, func in [("dict Expense", load_dict_expenses), ("slots Expense", load_expenses), ("ExpenseBatch", load_batch)]:
+            results[name], result = allocated(func, model.db, start)
+            count = len(result)
+            del result
+        model.close()
+
+    print(f"{count} expenses of {years} years")
+    print(f"{'representation':<16}{'KiB':>10}{'bytes/row':>12}")
+    for name, size in results.items():
+        print(f"{name:<16}{size / 1024:>10.0f}{size / count:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Measure how long importing the bot takes in a fresh interpreter
+and check that heavy dependencies are not imported at startup.
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+
+import sys
+import subprocess
+import statistics
+
+# modules which must only be imported on first use
+LAZY_MODULES = ["matplotlib", "numpy"]
+
+SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+import bot.controllers, bot.balance_tracker
+duration = time.perf_counter() - start
+loaded = [name for name in {LAZY_MODULES!r} if name in sys.modules]
+print(duration, ",".join(loaded))
+"""
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    durations = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True).stdout
+        duration, loaded = output.split(" ")
+        loaded = loaded.strip()
+        if loaded:
+            print(f"Imported at startup: {loaded}")
+            sys.exit(1)
+        durations.append(float(duration))
+
+    print(f"import time: median {statistics.median(durations) * 1000:.1f} ms, min {min(durations) * 1000:.1f} ms ({runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
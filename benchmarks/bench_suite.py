@@ -0,0 +1,207 @@
+"""
+Benchmark the model, controllers and view on synthetic data (see benchmarks/synthetic.py)
+and save results as JSON, so runs of different commits can be compared.
+
+Usage: python -m benchmarks.bench_suite [--years N] [--seed S] [--repeat R]
+                                        [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import filters
+
+from bot.charts import ChartRenderer
+from bot.controllers import MasterController, MonthStat
+from bot.core.interfaces import Expense
+from bot.aggregation import months_between
+from bot.model import Model
+from bot.model_registry import ModelRegistry
+from bot.view import View
+from benchmarks.offline_bot import offline_application
+from benchmarks.synthetic import END, generate
+
+USER_ID = 42
+
+
+def summary(durations: list[float]) -> dict[str, float]:
+    """Statistics of durations (in seconds) of single operations."""
+
+    durations = sorted(durations)
+    return {
+        "ops_per_sec": len(durations) / sum(durations),
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p50_ms": durations[len(durations) // 2] * 1000,
+        "p95_ms": durations[int(len(durations) * 0.95)] * 1000
+    }
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return summary(durations)
+
+
+async def measure_async(func: Callable[[], Awaitable], repeat: int) -> dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        durations.append(time.perf_counter() - start)
+    return summary(durations)
+
+
+def fake_update(bot, text: str) -> Update:
+    """Update with a private message of the benchmark user."""
+
+    return Update.de_json(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": USER_ID, "type": "private"},
+                "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+                "text": text
+            }
+        },
+        bot
+    )
+
+
+def bench_model(models: ModelRegistry, months: list[datetime], repeat: int) -> dict[str, dict]:
+    with models.lease(USER_ID) as model:
+        return bench_db(model, months, repeat)
+
+
+def bench_db(model: Model, months: list[datetime], repeat: int) -> dict[str, dict]:
+    results = {}
+
+    # a month of every query in turn
+    month_iter = iter(months * (repeat // len(months) + 1))
+    results["expenses_in"] = measure(lambda: model.db.expenses_in(next(month_iter)), repeat)
+    results["get_categories"] = measure(model.db.get_categories, repeat)
+
+    # last, since it changes the data
+    expense = Expense(10, "food", None, END)
+    results["add_expense"] = measure(lambda: model.db.add_expense(expense), repeat)
+    return results
+
+
+async def bench_bot(models: ModelRegistry, months: list[datetime], repeat: int) -> dict[str, dict]:
+    application, _ = offline_application()
+    view = View(chart_workers=0)
+    # every chart is rendered, as for a month viewed for the first time
+    view.charts = ChartRenderer(cache_size=0)
+    controller = MasterController(application, filters.User(user_id=USER_ID), view, models)
+    results = {}
+
+    async with application:
+        update = fake_update(application.bot, "/current_month")
+        month_iter = iter(months * (repeat // len(months) + 1))
+
+        # the whole handler: database reads, chart rendering and sending
+        # (in a task, as handlers are run by the application)
+        results["month_statistics"] = await measure_async(
+            lambda: asyncio.create_task(controller.month_stat.statistics(update, next(month_iter))),
+            repeat
+        )
+
+        # only rendering and sending of prepared statistics
+        with models.lease(USER_ID) as model:
+            prepared = [MonthStat.month_statistics_of(model, month) for month in months]
+        prepared_iter = iter(prepared * (repeat // len(prepared) + 1))
+        results["view_month_statistics"] = await measure_async(
+            lambda: view.month_statistics(update, next(prepared_iter)),
+            repeat
+        )
+
+        year = END.year - 1
+        results["year_statistics"] = await measure_async(
+            lambda: asyncio.create_task(controller.range_stat.statistics(update, str(year), datetime(year, 1, 1), datetime(year + 1, 1, 1))),
+            max(repeat // 10, 1)
+        )
+
+    view.close()
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Print change of throughput of every benchmark against a baseline."""
+
+    print(f"\n{'benchmark':<24}{'baseline':>12}{'current':>12}{'change':>10}   (ops/sec, baseline {baseline.get('commit')})")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["ops_per_sec"]
+        new = result["ops_per_sec"]
+        print(f"{name:<24}{old:>12.1f}{new:>12.1f}{(new / old - 1) * 100:>+9.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the bot on synthetic data.")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        generate(Path(tmp) / "data", args.years, args.seed).close()
+        generation = time.perf_counter() - start
+
+        models = ModelRegistry(str(Path(tmp) / "data"))
+        last_year = END.replace(year=END.year - 1)
+        months = [datetime.strptime(month, "%Y-%m") for month in months_between(last_year, END)]
+
+        results = {}
+        results.update(bench_model(models, months, args.repeat))
+        results.update(asyncio.run(bench_bot(models, months, max(args.repeat // 10, 1))))
+        models.close()
+
+    output = {
+        "commit": git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "parameters": vars(args) | {"generation_sec": generation},
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(f"{'benchmark':<24}{'ops/sec':>12}{'mean ms':>10}{'p95 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<24}{result['ops_per_sec']:>12.1f}{result['mean_ms']:>10.2f}{result['p95_ms']:>10.2f}")
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(output, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
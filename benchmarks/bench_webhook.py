@@ -0,0 +1,116 @@
+"""
+Measure end-to-end latency of handling updates received by the webhook server:
+recorded updates (benchmarks/updates.jsonl) are POSTed one by one to the server on localhost
+and the time until the bot sends its reply is taken. Bot API requests are answered
+in-process, so no network access is needed.
+
+Usage: python -m benchmarks.bench_webhook [rounds]
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from telegram.ext import filters
+
+from bot.controllers import MasterController
+from bot.model_registry import ModelRegistry
+from bot.view import View
+from bot.webhook import WebhookServer
+from benchmarks.offline_bot import offline_application
+
+UPDATES_PATH = Path(__file__).parent / "updates.jsonl"
+SECRET = "benchmark"
+
+
+def recorded_updates(rounds: int) -> list[dict]:
+    """Recorded updates repeated given number of times, with unique ids."""
+
+    with open(UPDATES_PATH) as f:
+        recorded = [json.loads(line) for line in f]
+
+    updates = []
+    for i in range(rounds * len(recorded)):
+        update = json.loads(json.dumps(recorded[i % len(recorded)]))
+        update["update_id"] = i
+        update["message"]["message_id"] = i
+        updates.append(update)
+    return updates
+
+
+async def post(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, body: bytes) -> int:
+    """POST a body over a kept-alive connection and return the response status."""
+
+    writer.write(
+        f"POST {path} HTTP/1.1\r\n"
+        f"Host: localhost\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\n"
+        f"\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) not in [b"\r\n", b""]:
+        pass
+    return status
+
+
+async def run(rounds: int, data_dir: str) -> list[float]:
+    application, request = offline_application()
+    models = ModelRegistry(data_dir, single_writer=True)
+    view = View(chart_workers=0)
+    controller = MasterController(application, filters.User(user_id=42), view, models)
+    controller.register_handlers()
+    webhook = WebhookServer(application, "https://bot.example/telegram", listen="127.0.0.1", port=0, secret_token=SECRET)
+
+    latencies = []
+    async with application:
+        await application.start()
+        await webhook.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", webhook.port)
+
+        for update in recorded_updates(rounds):
+            sent_before = len(request.sent)
+            start = time.perf_counter()
+            status = await post(reader, writer, webhook.path, json.dumps(update).encode())
+            assert status == 200, status
+
+            # wait for the reply to the update
+            while len(request.sent) == sent_before:
+                request.event.clear()
+                await asyncio.wait_for(request.event.wait(), timeout=30)
+            latencies.append(request.sent[sent_before][0] - start)
+
+        writer.close()
+        await webhook.stop()
+        await application.stop()
+
+    models.close()
+    view.close()
+    return latencies
+
+
+def main() -> None:
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        latencies = asyncio.run(run(rounds, tmp))
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    print(f"updates:      {len(latencies_ms)}")
+    print(f"updates/sec:  {len(latencies_ms) / elapsed:.0f}")
+    print(f"mean latency: {statistics.mean(latencies_ms):.2f} ms")
+    print(f"p50 latency:  {latencies_ms[len(latencies_ms) // 2]:.2f} ms")
+    print(f"p95 latency:  {latencies_ms[int(len(latencies_ms) * 0.95)]:.2f} ms")
+    print(f"max latency:  {latencies_ms[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
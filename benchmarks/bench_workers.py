@@ -0,0 +1,66 @@
+"""
+Compare updates/sec of handling a synthetic load (an expense added, balance and
+month totals read, then a reply sent with simulated network latency) with 1 and N
+worker threads, writing directly from the workers or through the single writer thread.
+
+Usage: python -m benchmarks.bench_workers [updates] [workers] [send latency ms]
+"""
+
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bot.core.interfaces import Expense
+from bot.core.utils import time_now
+from bot.model import Database
+
+
+def handle_update(db: Database, latency: float) -> None:
+    """What an /expense conversation and a /balance command do with the DB."""
+
+    now = time_now()
+    db.add_expense(Expense(10, "food", None, now))
+    db.get_balance()
+    db.category_totals_in(now)
+    # sending the reply
+    time.sleep(latency)
+
+
+def run(path: Path, updates: int, workers: int, latency: float, single_writer: bool) -> float:
+    db = Database(path)
+    db.create_schema()
+    db.migrate()
+    db.add_category("other")
+    db.add_category("food")
+    if single_writer:
+        db.start_writer()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(handle_update, db, latency) for _ in range(updates)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    db.close()
+    return updates / elapsed
+
+
+def main() -> None:
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    print(f"{'workers':<10}{'writes':<16}{'updates/sec':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [1, workers]:
+            for single_writer in [False, True]:
+                path = Path(tmp) / f"{n}-{single_writer}.db"
+                result = run(path, updates, n, latency, single_writer)
+                writes = "single writer" if single_writer else "direct"
+                print(f"{n:<10}{writes:<16}{result:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Check that concurrent conversations of different users don't interfere: many users
+go through /expense and /income conversations at once, with their messages interleaved
+in random order, then every user's data and replies are compared with what the user entered.
+Exits with status 1 if anything differs.
+
+Usage: python -m benchmarks.check_conversations [users] [seed]
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from telegram import Update
+from telegram.ext import filters
+
+from bot.controllers import MasterController
+from bot.core.utils import time_now
+from bot.model_registry import ModelRegistry
+from bot.view import View
+from benchmarks.offline_bot import OfflineRequest, offline_application
+
+# users get ids from FIRST_USER_ID on
+FIRST_USER_ID = 1000
+# seconds a reply is waited for
+REPLY_TIMEOUT = 5
+# fewer models are kept open than there are users, so they are evicted while in use
+MAX_OPEN_MODELS = 8
+
+
+def user_update(bot, user_id: int, text: str) -> Update:
+    """Update with a private message of a given user (a command if it starts with "/")."""
+
+    message = {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+        "text": text
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": 1, "message": message}, bot)
+
+
+def replies_to(request: OfflineRequest, user_id: int) -> list[str]:
+    """Texts of messages sent to a given user so far."""
+
+    return [
+        parameters.get("text", "")
+        for _, method, parameters in request.sent
+        if method == "sendMessage" and str(parameters.get("chat_id")) == str(user_id)
+    ]
+
+
+async def converse(application, request: OfflineRequest, user_id: int, messages: list[str], rng: random.Random) -> str | None:
+    """
+    Send messages of a user one by one, each after the reply to the previous one.
+    Returns the message left without a reply (None if all got one).
+    """
+
+    for message in messages:
+        # other users' messages get in between
+        await asyncio.sleep(rng.random() * 0.005)
+        expected = len(replies_to(request, user_id)) + 1
+        await application.process_update(user_update(application.bot, user_id, message))
+        deadline = time.perf_counter() + REPLY_TIMEOUT
+        while len(replies_to(request, user_id)) < expected:
+            if time.perf_counter() > deadline:
+                return message
+            await asyncio.sleep(0.001)
+    return None
+
+
+def conversation_of(user_id: int) -> tuple[float, float, list[str]]:
+    """Expense and income amounts of a user and messages of their conversations."""
+
+    expense = float(user_id % 97 + 1)
+    income = float(user_id)
+    messages = [
+        "/expense", str(expense), "other", f"expense of {user_id}",
+        "/income", str(income), f"income of {user_id}"
+    ]
+    return expense, income, messages
+
+
+def check_user(models: ModelRegistry, request: OfflineRequest, user_id: int) -> list[str]:
+    """Differences between data and replies of a user and what they entered."""
+
+    expense, income, _ = conversation_of(user_id)
+    errors = []
+
+    with models.lease(user_id) as model:
+        expenses = [(e.amount, e.category, e.description) for e in model.db.expenses_in(time_now())]
+        balance = model.get_balance()
+    if expenses != [(expense, "other", f"expense of {user_id}")]:
+        errors.append(f"expenses {expenses}")
+    if balance != income - expense:
+        errors.append(f"balance {balance}, expected {income - expense}")
+
+    replies = replies_to(request, user_id)
+    if not (replies and f"Amount: {income:.2f}" in replies[-1] and f"income of {user_id}" in replies[-1]):
+        errors.append(f"last reply {replies[-1:]!r}")
+    if not any(f"Amount: {expense:.2f}" in reply and f"expense of {user_id}" in reply for reply in replies):
+        errors.append("no reply with the added expense")
+    return errors
+
+
+async def run(folder: Path, users: int, seed: int) -> int:
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + users))
+    application, request = offline_application()
+    models = ModelRegistry(str(folder), multi_user=True, max_open=MAX_OPEN_MODELS, single_writer=True)
+    controller = MasterController(application, filters.User(user_id=user_ids), View(chart_workers=0), models)
+    controller.register_handlers()
+
+    rng = random.Random(seed)
+    async with application:
+        # started, so tasks of non-blocking handlers are awaited on stop
+        await application.start()
+        unanswered = await asyncio.gather(*(
+            converse(application, request, user_id, conversation_of(user_id)[2], random.Random(rng.random()))
+            for user_id in user_ids
+        ))
+        await application.stop()
+
+    failed = 0
+    for user_id, message in zip(user_ids, unanswered):
+        errors = check_user(models, request, user_id)
+        if message is not None:
+            errors.insert(0, f"no reply to {message!r}")
+        if errors:
+            failed += 1
+            print(f"user {user_id}: {'; '.join(errors)}")
+    models.close()
+    controller.view.close()
+    return failed
+
+
+def main() -> None:
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failed = asyncio.run(run(Path(tmp), users, seed))
+
+    print(f"{users - failed} of {users} interleaved conversations ok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
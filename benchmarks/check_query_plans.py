@@ -0,0 +1,64 @@
+"""
+Check that month and range queries of Database seek expenses_time_idx instead of
+scanning the expenses table: statements executed by each method are recorded with
+their EXPLAIN QUERY PLAN, and the script exits with status 1 if an expected search is missing.
+
+Usage: python -m benchmarks.check_query_plans
+"""
+
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from bot.core.interfaces import Expense
+from bot.model import Database
+from bot.sql_trace import SqlTracer
+
+MONTH = datetime(2024, 3, 1)
+
+# method of Database, its arguments and a line its query plan must contain
+CHECKS = [
+    ("expenses_in", (MONTH,), "SEARCH expenses USING INDEX expenses_time_idx (time>? AND time<?)"),
+    ("expense_batch", (MONTH, datetime(2025, 1, 1)), "SEARCH expenses USING COVERING INDEX expenses_time_idx (time>? AND time<?)"),
+    ("biggest_expenses_in", (MONTH, 3), "SEARCH expenses USING INDEX expenses_time_idx (time>? AND time<?)")
+]
+
+
+class PlanRecorder(SqlTracer):
+    """Tracer keeping query plans of executed statements instead of logging them."""
+
+    def __init__(self) -> None:
+        super().__init__(None, None)
+        self.plans: list[str] = []
+
+    def record(self, conn, sql: str, parameters, duration: float, rows: int, steps: int) -> None:
+        self.plans.append(self._query_plan(conn, sql, parameters))
+
+
+def main() -> None:
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = PlanRecorder()
+        db = Database(Path(tmp) / "database.db", tracer=recorder)
+        db.create_schema()
+        db.migrate()
+        db.add_category("other")
+        db.add_expense(Expense(10, "other", None, MONTH))
+
+        for method, args, expected in CHECKS:
+            recorder.plans.clear()
+            getattr(db, method)(*args)
+            plans = "\n".join(recorder.plans)
+            found = any(line.strip() == expected for line in plans.splitlines())
+            print(f"{'ok' if found else 'FAILED':<8}{method}: {expected}")
+            if not found:
+                print(plans)
+                failed = True
+        db.close()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Application whose Bot API requests never leave the process: every request is answered
+with a plausible result and recorded, so handlers can be benchmarked without network access.
+"""
+
+import asyncio
+import json
+import time
+
+from telegram.ext import Application
+from telegram.request import BaseRequest, RequestData
+
+
+class OfflineRequest(BaseRequest):
+    """Answers Bot API requests locally and records (time, method, parameters) of each one."""
+
+    def __init__(self, latency: float = 0) -> None:
+        # simulated network round trip of a request
+        self.latency = latency
+        self.sent: list[tuple[float, str, dict]] = []
+        # set whenever a request is made
+        self.event = asyncio.Event()
+
+    @property
+    def read_timeout(self) -> float | None:
+        # required by newer versions of BaseRequest, nothing is read from the network
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None, *args, **kwargs) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((time.perf_counter(), endpoint, parameters))
+        self.event.set()
+
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "offline_bot"}
+        elif endpoint.startswith("send"):
+            result = {"message_id": len(self.sent), "date": int(time.time()), "chat": {"id": parameters.get("chat_id", 0), "type": "private"}}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def offline_application(latency: float = 0) -> tuple[Application, OfflineRequest]:
+    """Build an Application using an OfflineRequest (returned as well, to inspect sent requests)."""
+
+    request = OfflineRequest(latency)
+    application = (
+        Application.builder()
+        .token("1:offline")
+        .request(request)
+        .get_updates_request(OfflineRequest())
+        .build()
+    )
+    return application, request
@@ -0,0 +1,95 @@
+"""
+Deterministic generator of a data folder with N years of expenses, incomes,
+categories and month end balance snapshots (the same seed always gives the same data).
+
+Usage: python -m benchmarks.synthetic [folder] [years] [seed]
+"""
+
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+from bot.core.interfaces import Expense, Income
+from bot.model import Model
+
+# data ends here (not at the current time), so it doesn't depend on when it is generated
+END = datetime(2025, 1, 1)
+
+# category: (relative frequency, median amount)
+CATEGORIES = {
+    "food": (10, 12),
+    "transport": (5, 4),
+    "coffee": (6, 3),
+    "rent": (0, 800),
+    "utilities": (1, 60),
+    "health": (1, 40),
+    "clothes": (1, 55),
+    "entertainment": (2, 25),
+    "gifts": (1, 30),
+    "travel": (0.3, 300)
+}
+DESCRIPTIONS = [None, None, None, "lunch", "groceries", "taxi", "cinema", "pharmacy", "present", "tickets"]
+
+
+def transactions(years: int, seed: int = 0, expenses_per_day: float = 4) -> Iterator[Expense | Income]:
+    """Yield expenses and incomes of given number of years before END in time order."""
+
+    rng = random.Random(seed)
+    names = [name for name, (weight, _) in CATEGORIES.items() if weight > 0]
+    weights = [CATEGORIES[name][0] for name in names]
+
+    day = END.replace(year=END.year - years)
+    while day < END:
+        # salary and rent on the first day of every month
+        if day.day == 1:
+            yield Income(round(rng.gauss(3000, 200), 2), "salary", day + timedelta(hours=9))
+            yield Expense(CATEGORIES["rent"][1], "rent", "rent", day + timedelta(hours=10))
+        if rng.random() < 0.03:
+            yield Income(round(rng.uniform(50, 500), 2), "side job", day + timedelta(hours=18))
+
+        # expenses of the day at increasing random times
+        count = min(int(rng.expovariate(1 / expenses_per_day)), 30)
+        seconds = sorted(rng.randrange(8 * 3600, 23 * 3600) for _ in range(count))
+        for second in seconds:
+            category = rng.choices(names, weights)[0]
+            amount = round(CATEGORIES[category][1] * rng.lognormvariate(0, 0.5), 2)
+            yield Expense(amount, category, rng.choice(DESCRIPTIONS), day + timedelta(seconds=second))
+
+        day += timedelta(days=1)
+
+
+def generate(folder: str | Path, years: int, seed: int = 0, initial_balance: float = 5000) -> Model:
+    """
+    Fill a data folder (which must not have a database yet) the same way the bot would:
+    categories from categories.json, transactions and month end balance snapshots.
+    Returns the set up Model.
+    """
+
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(folder / "categories.json", "w", encoding="utf8") as f:
+        json.dump(list(CATEGORIES), f)
+
+    model = Model(str(folder))
+    model.setup()
+    model.set_balance(initial_balance)
+    model.db.import_transactions(transactions(years, seed))
+    model.db.backfill_balance_history(END)
+    return model
+
+
+def main() -> None:
+    folder = sys.argv[1] if len(sys.argv) > 1 else "data"
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    model = generate(folder, years, seed)
+    model.close()
+    print(f"Generated {years} years of data in \"{folder}\".")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from .core.interfaces import ExpenseBatch
+from .core.utils import month_range
+
+
+def months_between(start: datetime, end: datetime) -> list[str]:
+    """Get every month ("YYYY-MM") touched by the range from start (inclusive) to end (exclusive)."""
+
+    months = []
+    month, _ = month_range(start)
+    while month < end:
+        months.append(f"{month:%Y-%m}")
+        _, month = month_range(month)
+    return months
+
+
+def month_category_matrix(batch: ExpenseBatch, month_labels: list[str]) -> tuple[list[str], list[list[float]]]:
+    """
+    Sum amounts of a batch of expenses into a matrix with a row per month of month_labels
+    (consecutive months containing all months of the expenses) and a column per category.
+    Returns categories of the columns (biggest total first) and the matrix.
+    """
+
+    # numpy is imported on first use, so it doesn't slow down the bot startup
+    import numpy as np
+
+    if not batch:
+        return [], [[] for _ in month_labels]
+
+    # columns of the batch are used without copying
+    amounts = np.frombuffer(batch.amounts, dtype=np.float64)
+    times = np.frombuffer(batch.times, dtype=np.int64)
+    category_index = np.frombuffer(batch.category_ids, dtype=np.intc)
+    category_labels = np.asarray(batch.categories)
+
+    # months since the first label, computed from the times without formatting them
+    months = times.astype("datetime64[s]").astype("datetime64[M]")
+    month_index = (months - np.datetime64(month_labels[0], "M")).astype(np.int64)
+
+    # one pass over all expenses: sum by the flat (month, category) cell index
+    cell_index = month_index * len(category_labels) + category_index
+    matrix = np.bincount(
+        cell_index,
+        weights=amounts,
+        minlength=len(month_labels) * len(category_labels)
+    ).reshape(len(month_labels), len(category_labels))
+
+    order = np.argsort(-matrix.sum(axis=0), kind="stable")
+    return category_labels[order].tolist(), matrix[:, order].tolist()
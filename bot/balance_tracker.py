@@ -1,32 +1,46 @@
-import time
-from datetime import datetime
-
-from .model import Model
-
-
-def track_balance(model: Model) -> None:
-    """Store current balance into DB at the end of every month (1 minute before the end)."""
-
-    while True:
-        # Get how much time to wait in seconds
-        current = datetime.now()
-
-        # get next month datetime obj
-        if current.month < 12:
-            next_month = datetime(current.year, current.month + 1, 1, 0, 0, 0)
-        else:
-            next_month = datetime(current.year + 1, 1, 1, 0, 0, 0)
-
-        # calculate difference in seconds - 60
-        # (so the datetime.now() clearly stays in bounds of the current month)
-        waiting_time = (next_month - current).total_seconds() - 60
-        
-        time.sleep(waiting_time)
-        
-        # store current balance into DB
-        now = datetime.now().replace(microsecond=0)
-        balance = model.get_balance()
-        model.db.add_balance_to_history(now, balance)
-
-        # sleep additional 60 seconds so the next iteration clearly deals with next coming month
-        time.sleep(120)
\ No newline at end of file
+import asyncio
+from datetime import datetime, time
+from typing import Iterable
+
+from telegram.ext import CallbackContext, Job, JobQueue
+# installed with APScheduler, which runs the job queue
+from tzlocal import get_localzone
+
+from .core.utils import time_now
+from .model_registry import ModelRegistry
+
+
+def store_balances(models: ModelRegistry, user_ids: Iterable[int], now: datetime | None = None) -> None:
+    """Store current balance of given users into their DBs (once per data folder, since in single-user mode they share one)."""
+
+    now = now or time_now()
+    users_by_folder = {models.folder_for(user_id): user_id for user_id in user_ids}
+    for user_id in users_by_folder.values():
+        with models.lease(user_id) as model:
+            balance = model.get_balance()
+            model.db.add_balance_to_history(now, balance)
+
+
+async def snapshot_balances(context: CallbackContext) -> None:
+    """Job storing balances of the users given in its data."""
+
+    models, user_ids = context.job.data
+    await asyncio.to_thread(store_balances, models, user_ids)
+
+
+def track_balance(job_queue: JobQueue, models: ModelRegistry, user_ids: Iterable[int]) -> Job:
+    """
+    Schedule storing current balance of given users into their DBs at the end of every month
+    (1 minute before the end, so the time clearly stays in bounds of the month).
+    Months missed while the bot wasn't running are backfilled when models are set up.
+    """
+
+    # balances are stored in local time, as all other times; the zone (unlike a fixed
+    # UTC offset) keeps the job at 23:59 of local time across daylight saving changes
+    return job_queue.run_monthly(
+        snapshot_balances,
+        when=time(23, 59, tzinfo=get_localzone()),
+        day=-1,
+        data=(models, tuple(user_ids)),
+        name="balance snapshot"
+    )
@@ -0,0 +1,140 @@
+import io
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+
+
+def render_bar_chart(title: str, categories: list[str], amounts: list[float]) -> bytes:
+    """
+    Render a horizontal bar chart into PNG bytes.
+    Uses its own Figure instead of the global pyplot state, so it is safe to call from any thread.
+    """
+
+    # matplotlib is imported on first use, so it doesn't slow down the bot startup
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=(10, 6), dpi=100)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+
+    axes.grid(True, linestyle=":", color="gray", linewidth=0.5)
+    barchart = axes.barh(categories, amounts, height=0.7)
+    axes.set_title(title)
+    axes.set_xlabel("Amount of money spent")
+
+    # adding amounts into respective bars
+    for bar, amount in zip(barchart, amounts):
+        axes.text(bar.get_width() - 10, bar.get_y() + bar.get_height() / 2, f"{amount:.0f}", color="white", ha="right", va="center", size=18)
+
+    figure.tight_layout()
+
+    # save figure to an io buffer
+    img_buffer = io.BytesIO()
+    figure.savefig(img_buffer, format="png")
+    return img_buffer.getvalue()
+
+
+def render_stacked_chart(title: str, months: list[str], categories: list[str], amounts: list[list[float]]) -> bytes:
+    """
+    Render a bar per month stacked from amounts of categories (amounts has a row
+    per month and a column per category) into PNG bytes.
+    """
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=(12, 6), dpi=100)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+
+    axes.grid(True, axis="y", linestyle=":", color="gray", linewidth=0.5)
+    bottoms = [0.0] * len(months)
+    for i, category in enumerate(categories):
+        heights = [row[i] for row in amounts]
+        axes.bar(months, heights, bottom=bottoms, label=category, width=0.7)
+        bottoms = [bottom + height for bottom, height in zip(bottoms, heights)]
+
+    axes.set_title(title)
+    axes.set_ylabel("Amount of money spent")
+    axes.tick_params(axis="x", labelrotation=45)
+    if categories:
+        axes.legend(loc="upper left", bbox_to_anchor=(1, 1))
+
+    figure.tight_layout()
+
+    img_buffer = io.BytesIO()
+    figure.savefig(img_buffer, format="png")
+    return img_buffer.getvalue()
+
+
+class ChartRenderer:
+    """
+    Renders charts in a pool of worker processes (or in a single worker thread
+    if there are 0 workers) and keeps PNG bytes of the most recently used ones (LRU).
+    """
+
+    def __init__(self, cache_size: int = 32, workers: int = 0) -> None:
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # "spawn" so workers don't inherit locks held by threads of the bot
+        if workers > 0:
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+
+    def bar_chart_async(self, title: str, categories: list[str], amounts: list[float]) -> Future[bytes]:
+        """
+        Get a Future of a bar chart PNG. It is already done if the same chart is cached,
+        otherwise the chart is rendered by a worker.
+        """
+
+        # charts of past months never change, so they are rendered once
+        key = ("bar", title, tuple(categories), tuple(amounts))
+        return self._render_async(key, render_bar_chart, title, list(categories), list(amounts))
+
+    def stacked_chart_async(self, title: str, months: list[str], categories: list[str], amounts: list[list[float]]) -> Future[bytes]:
+        """Get a Future of a stacked bar chart PNG (see render_stacked_chart), cached like bar charts."""
+
+        key = ("stacked", title, tuple(months), tuple(categories), tuple(map(tuple, amounts)))
+        return self._render_async(key, render_stacked_chart, title, list(months), list(categories), [list(row) for row in amounts])
+
+    def _render_async(self, key: tuple, render: Callable[..., bytes], *args) -> Future[bytes]:
+        """Get a Future of a chart cached under a key, submitting render(*args) to the pool if it isn't cached."""
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+
+        future = self._pool.submit(render, *args)
+        future.add_done_callback(lambda f: self._store(key, f))
+        return future
+
+    def bar_chart(self, title: str, categories: list[str], amounts: list[float]) -> bytes:
+        """Get PNG of a bar chart, waiting for it to be rendered."""
+
+        return self.bar_chart_async(title, categories, amounts).result()
+
+    def _store(self, key: tuple, future: Future[bytes]) -> None:
+        """Put a successfully rendered chart into the cache."""
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        with self._lock:
+            self._cache[key] = future.result()
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def shutdown(self) -> None:
+        """Stop workers."""
+
+        self._pool.shutdown(cancel_futures=True)
@@ -1,21 +1,32 @@
-from datetime import datetime
-
-from telegram.update import Update
+import asyncio
+import signal
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from telegram import Update
 from telegram.ext import (
-    Updater,
+    Application,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
-    Filters,
-    BaseFilter,
-    CallbackContext
+    TypeHandler,
+    CallbackContext,
+    filters
 )
+from telegram.ext.filters import BaseFilter
 
 from .core.controller_abc import Controller, block_if_in_blocked_mode
-from .core.interfaces import Expense, Income, MonthStatistics
-from .core.utils import time_now, isfloat, split_in_rows
+from .core.metrics import METRICS, timed
+from .core.interfaces import Expense, Income, MonthStatistics, RangeStatistics
+from .core.utils import time_now, isfloat, date_from_str, month_range
+from .core.startup_profile import StartupProfile
 from .view import View
 from .model import Model
+from .model_registry import ModelRegistry
+from .aggregation import months_between, month_category_matrix
+from .webhook import WebhookServer
 
 
 class AddExpense(Controller):
@@ -24,21 +35,22 @@ class AddExpense(Controller):
     CATEGORY = 1
     DESCRIPTION = 2
 
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        super().__init__(updater, user_filter, view, model)
-        # save expense object for filling up between conversation states
-        self.exp = None
+    # key in context.user_data (kept per user, so conversations don't interfere)
+    # of the Expense object filled up between conversation states
+    USER_DATA_KEY = "expense"
     
+    @timed
     @block_if_in_blocked_mode
-    def expense(self, update: Update, context: CallbackContext) -> int:
+    async def expense(self, update: Update, context: CallbackContext) -> int:
         """/expense command - entry point to conversation."""
 
         # create dummy Expense object to fill in the process
-        self.exp = Expense(0, "", None, time_now())
-        self.view.reply(update, "Adding new expense.\nEnter the amount:")
+        context.user_data[AddExpense.USER_DATA_KEY] = Expense(0, "", None, time_now())
+        await self.view.reply(update, "Adding new expense.\nEnter the amount:")
         return AddExpense.AMOUNT
     
-    def amount(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def amount(self, update: Update, context: CallbackContext) -> int:
         """
         Getting expense amount from user until it's a valid number.
         Then ask to choose a category with a keyboard.
@@ -46,14 +58,15 @@ class AddExpense(Controller):
 
         message = update.message.text.lower()
         if not isfloat(message):
-            self.view.reply(update, f"\"{message}\" is not a valid number.\nTry again.")
+            await self.view.reply(update, f"\"{message}\" is not a valid number.\nTry again.")
             return
 
-        self.exp.amount = float(message)
+        context.user_data[AddExpense.USER_DATA_KEY].amount = float(message)
         
         # send keyboard with categories to choose from
-        buttons = split_in_rows(self.model.db.get_categories(), row_size=3)
-        self.view.reply_with_replykeyboard(
+        model = await self.model_for(update)
+        buttons = await self.run_blocking(model.db.category_rows, row_size=3)
+        await self.view.reply_with_replykeyboard(
             update,
             text="Choose category name:",
             buttons=buttons,
@@ -61,7 +74,8 @@ class AddExpense(Controller):
         )
         return AddExpense.CATEGORY
     
-    def category(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def category(self, update: Update, context: CallbackContext) -> int:
         """
         Getting category name via keyboard or message.
         Category becomes \"other\" if the message doesn't match to any category.
@@ -69,85 +83,92 @@ class AddExpense(Controller):
         """
 
         category = update.message.text
-        if category not in self.model.db.get_categories():
+        model = await self.model_for(update)
+        if not await self.run_blocking(model.db.has_category, category):
             category = "other"
-            self.view.reply(update, "Choosing \"other\"")
+            await self.view.reply(update, "Choosing \"other\"")
 
-        self.exp.category = category
-        self.view.reply_and_remove_replykeyboard(update, "Add a description or /skip")
+        context.user_data[AddExpense.USER_DATA_KEY].category = category
+        await self.view.reply_and_remove_replykeyboard(update, "Add a description or /skip")
         return AddExpense.DESCRIPTION
     
-    def description(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def description(self, update: Update, context: CallbackContext) -> int:
         """
         Getting description of the expense, adding expense to the database,
         updating balance and finishing off the conversation.
         """
 
-        self.exp.description = update.message.text
-        # add and update data in model
-        self.model.db.add_expense(self.exp)
-        balance = self.model.get_balance()
-        self.model.set_balance(balance - self.exp.amount)
-        # reply and reset
-        self.view.expense(update, self.exp)
-        self.exp = None
+        expense = context.user_data.pop(AddExpense.USER_DATA_KEY)
+        expense.description = update.message.text
+        # add expense and update balance in model
+        model = await self.model_for(update)
+        await self.run_blocking(model.db.add_expense, expense)
+        # reply
+        await self.view.expense(update, expense)
         return ConversationHandler.END
     
-    def skip_description(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def skip_description(self, update: Update, context: CallbackContext) -> int:
         """
         Adding expense to the database, updating balance
         and finishing off the conversation.
         """
 
-        # add and update data in model
-        self.model.db.add_expense(self.exp)
-        balance = self.model.get_balance()
-        self.model.set_balance(balance - self.exp.amount)
-        # reply and reset
-        self.view.expense(update, self.exp)
-        self.exp = None
+        expense = context.user_data.pop(AddExpense.USER_DATA_KEY)
+        # add expense and update balance in model
+        model = await self.model_for(update)
+        await self.run_blocking(model.db.add_expense, expense)
+        # reply
+        await self.view.expense(update, expense)
         return ConversationHandler.END
     
-    def cancel(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def cancel(self, update: Update, context: CallbackContext) -> int:
         """/cancel command to stop the conversation at any state."""
 
         # reset and reply
-        self.exp = None
-        self.view.reply(update, "Command cancelled.")
+        context.user_data.pop(AddExpense.USER_DATA_KEY, None)
+        await self.view.reply(update, "Command cancelled.")
         return ConversationHandler.END
 
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(ConversationHandler(
+        app = self.application
+        app.add_handler(ConversationHandler(
             entry_points=[
                 CommandHandler(
                     "expense",
                     self.expense,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ],
             states={
                 AddExpense.AMOUNT: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.amount
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.amount,
+                        block=False
                     )
                 ],
                 AddExpense.CATEGORY: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.category
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.category,
+                        block=False
                     )
                 ],
                 AddExpense.DESCRIPTION: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.description
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.description,
+                        block=False
                     ),
                     CommandHandler(
                         "skip",
                         self.skip_description,
-                        filters=self.user_filter
+                        filters=self.user_filter,
+                        block=False
                     )
                 ]
             },
@@ -155,7 +176,8 @@ class AddExpense(Controller):
                 CommandHandler(
                     "cancel",
                     self.cancel,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ]
         ))
@@ -166,20 +188,20 @@ class AddIncome(Controller):
     AMOUNT = 0
     DESCRIPTION = 1
 
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        super().__init__(updater, user_filter, view, model)
-        # save income object for filling up between conversation states
-        self.inc = None
+    # key in context.user_data of the Income object filled up between conversation states
+    USER_DATA_KEY = "income"
     
+    @timed
     @block_if_in_blocked_mode
-    def income(self, update: Update, context: CallbackContext) -> int:
+    async def income(self, update: Update, context: CallbackContext) -> int:
         """/income command - entry point to conversation."""
 
-        self.inc = Income(0, "", time_now())
-        self.view.reply(update, "Adding new income.\nEnter the amount:")
+        context.user_data[AddIncome.USER_DATA_KEY] = Income(0, "", time_now())
+        await self.view.reply(update, "Adding new income.\nEnter the amount:")
         return AddIncome.AMOUNT
     
-    def amount(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def amount(self, update: Update, context: CallbackContext) -> int:
         """
         Getting income amount from user until it's a valid number.
         Then asking to add a description.
@@ -190,54 +212,58 @@ class AddIncome(Controller):
         if not isfloat(message):
             return
 
-        self.inc.amount = float(message)
-        self.view.reply(update, "Add a description:")
+        context.user_data[AddIncome.USER_DATA_KEY].amount = float(message)
+        await self.view.reply(update, "Add a description:")
         return AddIncome.DESCRIPTION
     
-    def description(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def description(self, update: Update, context: CallbackContext) -> int:
         """
         Getting description, adding income to the database,
         updating balance and finishing off the conversation.
         """
 
-        self.inc.description = update.message.text
-        # add and update data in model
-        self.model.db.add_income(self.inc)
-        balance = self.model.get_balance()
-        self.model.set_balance(balance + self.inc.amount)
-        # reply and reset
-        self.view.income(update, self.inc)
-        self.inc = None
+        income = context.user_data.pop(AddIncome.USER_DATA_KEY)
+        income.description = update.message.text
+        # add income and update balance in model
+        model = await self.model_for(update)
+        await self.run_blocking(model.db.add_income, income)
+        # reply
+        await self.view.income(update, income)
         return ConversationHandler.END
 
-    def cancel(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def cancel(self, update: Update, context: CallbackContext) -> int:
         """/cancel command to stop the conversation at any state."""
 
-        self.inc = None
-        self.view.reply(update, "Command cancelled.")
+        context.user_data.pop(AddIncome.USER_DATA_KEY, None)
+        await self.view.reply(update, "Command cancelled.")
         return ConversationHandler.END
     
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(ConversationHandler(
+        app = self.application
+        app.add_handler(ConversationHandler(
             entry_points=[
                 CommandHandler(
                     "income",
                     self.income,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ],
             states={
                 AddIncome.AMOUNT: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.amount
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.amount,
+                        block=False
                     )
                 ],
                 AddIncome.DESCRIPTION: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.description
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.description,
+                        block=False
                     )
                 ]
             },
@@ -245,7 +271,8 @@ class AddIncome(Controller):
                 CommandHandler(
                     "cancel",
                     self.cancel,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ]
         ))
@@ -255,49 +282,55 @@ class AddCategory(Controller):
     # states of the conversation
     CATEGORY = 0
 
+    @timed
     @block_if_in_blocked_mode
-    def add_category(self, update: Update, context: CallbackContext) -> int:
+    async def add_category(self, update: Update, context: CallbackContext) -> int:
         """/add_category command - entry point to conversation."""
 
-        self.view.reply(update, "Enter the name of a new category:")
+        await self.view.reply(update, "Enter the name of a new category:")
         return AddCategory.CATEGORY
     
-    def category(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def category(self, update: Update, context: CallbackContext) -> int:
         """Ask user for a new category name."""
 
         category = update.message.text.lower()
 
         # ask for a name until it is unique
-        if category in self.model.db.get_categories():
-            self.view.reply(update, "This name is already taken. Try again:")
+        model = await self.model_for(update)
+        if await self.run_blocking(model.db.has_category, category):
+            await self.view.reply(update, "This name is already taken. Try again:")
             return
         
-        self.model.db.add_category(category)
-        self.view.reply(update, f"Added new category: \"{category}\"")
+        await self.run_blocking(model.db.add_category, category)
+        await self.view.reply(update, f"Added new category: \"{category}\"")
 
         return ConversationHandler.END
     
-    def cancel(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def cancel(self, update: Update, context: CallbackContext) -> int:
         """/cancel command to stop the conversation at any state."""
 
-        self.view.reply(update, "Command cancelled.")
+        await self.view.reply(update, "Command cancelled.")
         return ConversationHandler.END
     
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(ConversationHandler(
+        app = self.application
+        app.add_handler(ConversationHandler(
             entry_points=[
                 CommandHandler(
                     "add_category",
                     self.add_category,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ],
             states={
                 AddCategory.CATEGORY: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.category
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.category,
+                        block=False
                     )
                 ]
             },
@@ -305,7 +338,8 @@ class AddCategory(Controller):
                 CommandHandler(
                     "cancel",
                     self.cancel,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ]
         ))
@@ -316,17 +350,17 @@ class UpdateCategory(Controller):
     CATEGORY = 0
     NEW_NAME = 1
 
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        super().__init__(updater, user_filter, view, model)
-        # save old name of the category between conversation states
-        self.old_name = None
+    # key in context.user_data of the old name of the category saved between conversation states
+    USER_DATA_KEY = "old_category_name"
 
+    @timed
     @block_if_in_blocked_mode
-    def update_category(self, update: Update, context: CallbackContext) -> int:
+    async def update_category(self, update: Update, context: CallbackContext) -> int:
         """/update_category command - entry point to conversation."""
 
-        buttons = split_in_rows(self.model.db.get_categories(), row_size=3)
-        self.view.reply_with_replykeyboard(
+        model = await self.model_for(update)
+        buttons = await self.run_blocking(model.db.category_rows, row_size=3)
+        await self.view.reply_with_replykeyboard(
             update,
             text="Choose which category to update:",
             buttons=buttons,
@@ -334,68 +368,74 @@ class UpdateCategory(Controller):
         )
         return UpdateCategory.CATEGORY
     
-    def category(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def category(self, update: Update, context: CallbackContext) -> int:
         """Ask the user which category to update."""
 
         old = update.message.text.lower()
 
-        # exclude "other" category from the list so it can't be updated
-        categories = self.model.db.get_categories()
-        categories.remove("other")
-        if old not in categories:
-            self.view.reply(update, "This category doesn't exist. Try again.")
-            return
+        # "other" category can't be updated
         if old == "other":
-            self.view.reply(update, "You cannot update \"other\". Try again.")
+            await self.view.reply(update, "You cannot update \"other\". Try again.")
+            return
+        model = await self.model_for(update)
+        if not await self.run_blocking(model.db.has_category, old):
+            await self.view.reply(update, "This category doesn't exist. Try again.")
             return
         
-        self.old_name = old
-        self.view.reply_and_remove_replykeyboard(update, f"Enter new name for category \"{old}\":")
+        context.user_data[UpdateCategory.USER_DATA_KEY] = old
+        await self.view.reply_and_remove_replykeyboard(update, f"Enter new name for category \"{old}\":")
         return UpdateCategory.NEW_NAME
     
-    def new_name(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def new_name(self, update: Update, context: CallbackContext) -> int:
         """Ask the user for a new category name."""
 
         new = update.message.text.lower()
 
         # ask for a name until it is unique
-        if new in self.model.db.get_categories():
-            self.view.reply(update, f"Name \"{new}\" is already taken. Try again:")
+        model = await self.model_for(update)
+        if await self.run_blocking(model.db.has_category, new):
+            await self.view.reply(update, f"Name \"{new}\" is already taken. Try again:")
             return
         
-        self.model.db.update_category(self.old_name, new)
-        self.view.reply(update, f"Renamed category \"{self.old_name}\" to \"{new}\".")
-        self.old_name = None
+        old = context.user_data.pop(UpdateCategory.USER_DATA_KEY)
+        await self.run_blocking(model.db.update_category, old, new)
+        await self.view.reply(update, f"Renamed category \"{old}\" to \"{new}\".")
         return ConversationHandler.END
 
-    def cancel(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def cancel(self, update: Update, context: CallbackContext) -> int:
         """/cancel command to stop the conversation at any state."""
 
-        self.old_name = None
-        self.view.reply(update, "Command cancelled.")
+        context.user_data.pop(UpdateCategory.USER_DATA_KEY, None)
+        await self.view.reply(update, "Command cancelled.")
         return ConversationHandler.END
     
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(ConversationHandler(
+        app = self.application
+        app.add_handler(ConversationHandler(
             entry_points=[
                 CommandHandler(
                     "update_category",
                     self.update_category,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ],
             states={
                 UpdateCategory.CATEGORY: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.category
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.category,
+                        block=False
                     )
                 ],
                 UpdateCategory.NEW_NAME: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.new_name
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.new_name,
+                        block=False
                     )
                 ]
             },
@@ -403,7 +443,8 @@ class UpdateCategory(Controller):
                 CommandHandler(
                     "cancel",
                     self.cancel,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ]
         ))
@@ -414,17 +455,17 @@ class DeleteCategory(Controller):
     CATEGORY = 0
     CONFIRM = 1
 
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        super().__init__(updater, user_filter, view, model)
-        # save category between conversation states
-        self.cat = None
+    # key in context.user_data of the category saved between conversation states
+    USER_DATA_KEY = "category_to_delete"
     
+    @timed
     @block_if_in_blocked_mode
-    def delete_category(self, update: Update, context: CallbackContext) -> int:
+    async def delete_category(self, update: Update, context: CallbackContext) -> int:
         """/delete_category command - entry point to conversation."""
 
-        buttons = split_in_rows(self.model.db.get_categories(), row_size=3)
-        self.view.reply_with_replykeyboard(
+        model = await self.model_for(update)
+        buttons = await self.run_blocking(model.db.category_rows, row_size=3)
+        await self.view.reply_with_replykeyboard(
             update,
             text="Choose which category to delete:",
             buttons=buttons,
@@ -432,76 +473,82 @@ class DeleteCategory(Controller):
         )
         return DeleteCategory.CATEGORY
     
-    def category(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def category(self, update: Update, context: CallbackContext) -> int:
         """Ask the user which category to delete."""
 
         cat = update.message.text.lower()
 
-        # exclude "other" category from the list so it can't be deleted
-        categories = self.model.db.get_categories()
-        categories.remove("other")
-        if cat not in categories:
-            self.view.reply(update, "This category doesn't exist. Try again.")
-            return
+        # "other" category can't be deleted
         if cat == "other":
-            self.view.reply(update, "You cannot delete \"other\". Try again.")
+            await self.view.reply(update, "You cannot delete \"other\". Try again.")
+            return
+        model = await self.model_for(update)
+        if not await self.run_blocking(model.db.has_category, cat):
+            await self.view.reply(update, "This category doesn't exist. Try again.")
             return
         
-        self.cat = cat
-        self.view.reply_with_replykeyboard(
+        context.user_data[DeleteCategory.USER_DATA_KEY] = cat
+        await self.view.reply_with_replykeyboard(
             update,
             text=f"Do you confirm deleting \"{cat}\"?",
             buttons=[["Yes"], ["No"]]
         )
-        return UpdateCategory.NEW_NAME
+        return DeleteCategory.CONFIRM
     
-    def confirm(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def confirm(self, update: Update, context: CallbackContext) -> int:
         """Ask the user to confirm deletion of the selected category."""
 
         answer = update.message.text
 
         # match the action based on confirmation answer
         if answer == "Yes":
-            self.model.db.delete_category(self.cat)
-            self.view.reply_and_remove_replykeyboard(update, f"Deleted category \"{self.cat}\".")
-            self.cat = None
+            cat = context.user_data.pop(DeleteCategory.USER_DATA_KEY)
+            model = await self.model_for(update)
+            await self.run_blocking(model.db.delete_category, cat)
+            await self.view.reply_and_remove_replykeyboard(update, f"Deleted category \"{cat}\".")
             return ConversationHandler.END
         elif answer == "No":
-            self.view.reply_and_remove_replykeyboard(update, "Operation cancelled.")
-            self.cat = None
+            await self.view.reply_and_remove_replykeyboard(update, "Operation cancelled.")
+            context.user_data.pop(DeleteCategory.USER_DATA_KEY, None)
             return ConversationHandler.END
         else:
-            self.view.reply(update, "Answer must be \"Yes\" or \"No\".\nTry again:")
+            await self.view.reply(update, "Answer must be \"Yes\" or \"No\".\nTry again:")
             return
     
-    def cancel(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def cancel(self, update: Update, context: CallbackContext) -> int:
         """/cancel command to stop the conversation at any state."""
 
-        self.old_name = None
-        self.view.reply_and_remove_replykeyboard(update, "Command cancelled.")
+        context.user_data.pop(DeleteCategory.USER_DATA_KEY, None)
+        await self.view.reply_and_remove_replykeyboard(update, "Command cancelled.")
         return ConversationHandler.END
     
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(ConversationHandler(
+        app = self.application
+        app.add_handler(ConversationHandler(
             entry_points=[
                 CommandHandler(
                     "delete_category",
                     self.delete_category,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ],
             states={
                 DeleteCategory.CATEGORY: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.category
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.category,
+                        block=False
                     )
                 ],
                 DeleteCategory.CONFIRM: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.confirm
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.confirm,
+                        block=False
                     )
                 ]
             },
@@ -509,83 +556,191 @@ class DeleteCategory(Controller):
                 CommandHandler(
                     "cancel",
                     self.cancel,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ]
         ))
 
 
+class ImportTransactions(Controller):
+
+    @timed
+    @block_if_in_blocked_mode
+    async def import_file(self, update: Update, context: CallbackContext) -> None:
+        """Import expenses and incomes from a sent .csv or .jsonl document."""
+
+        document = update.message.document
+        suffix = Path(document.file_name or "").suffix.lower()
+        if suffix not in [".csv", ".jsonl"]:
+            await self.view.reply(update, "Send a .csv or .jsonl file to import transactions.")
+            return
+
+        # download into a temporary file, so it is read as a stream
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / f"import{suffix}"
+            file = await context.bot.get_file(document.file_id)
+            await file.download_to_drive(path)
+            model = await self.model_for(update)
+            try:
+                imported, skipped = await self.run_blocking(model.import_file, path)
+            except ValueError as e:
+                await self.view.reply(update, f"Import failed: {e}")
+                return
+
+        await self.view.imported(update, imported, skipped)
+
+    def add_handlers(self) -> None:
+        app = self.application
+        app.add_handler(MessageHandler(filters.Document.ALL & self.user_filter, self.import_file, block=False))
+
+
+class ExportTransactions(Controller):
+
+    @timed
+    @block_if_in_blocked_mode
+    async def export(self, update: Update, context: CallbackContext) -> None:
+        """
+        /export [csv|jsonl] [gz] [YYYY-MM-DD [YYYY-MM-DD]] - command to send expenses, incomes
+        and balance history as a document (optionally gzipped and only between given dates inclusively).
+        """
+
+        fmt = "csv"
+        compress = False
+        dates = []
+        for arg in context.args:
+            arg = arg.lower()
+            if arg in ["csv", "jsonl"]:
+                fmt = arg
+            elif arg == "gz":
+                compress = True
+            else:
+                try:
+                    dates.append(date_from_str(arg))
+                except ValueError:
+                    await self.view.reply(update, f"Invalid /export argument \"{arg}\"")
+                    return
+        if len(dates) > 2:
+            await self.view.reply(update, "Invalid /export command")
+            return
+
+        start = dates[0] if len(dates) > 0 else None
+        end = dates[1] + timedelta(days=1) if len(dates) > 1 else None
+
+        # rows are streamed into a temporary file, which is then sent
+        filename = f"transactions.{fmt}" + (".gz" if compress else "")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / filename
+            model = await self.model_for(update)
+            await self.run_blocking(model.export_file, path, start, end)
+            await self.view.document(update, path)
+
+    def add_handlers(self) -> None:
+        app = self.application
+        app.add_handler(CommandHandler("export", self.export, filters=self.user_filter, block=False))
+
+
 class PlainCallbacks(Controller):
 
+    @timed
     @block_if_in_blocked_mode
-    def start(self, update: Update, context: CallbackContext) -> None:
+    async def start(self, update: Update, context: CallbackContext) -> None:
         """/start - command to start the bot."""
 
-        self.view.reply(update, "Bot started.")
+        await self.view.reply(update, "Bot started.")
     
+    @timed
     @block_if_in_blocked_mode
-    def help(self, update: Update, context: CallbackContext) -> None:
+    async def help(self, update: Update, context: CallbackContext) -> None:
         """/help - command to show the list of available commands."""
 
-        self.view.reply(update, "\n".join([
+        await self.view.reply(update, "\n".join([
             "Commands:",
             "/start - start the bot",
             "/help - this message",
             "/balance (num) - show (set) balance",
+            "/balance_at YYYY-MM-DD - show balance at the end of a day",
             "/expense - add new expense",
             "/income - add new income",
             "/cancel_last - cancel last expense",
             "/categories - show category names",
             "/add_category - add new category",
             "/update_category - rename existing category (except \"other\")",
-            "/delete_category - delete existing category (expenses become \"other\")"
+            "/delete_category - delete existing category (expenses become \"other\")",
+            "/month_statistics - show statistics of a month",
+            "/year_statistics [YYYY] - show statistics of a year by months",
+            "/range_statistics YYYY-MM-DD YYYY-MM-DD - show statistics between two dates by months",
+            "/export [csv|jsonl] [gz] [from] [to] - export transactions as a file",
+            "send a .csv or .jsonl file - import expenses and incomes"
         ]))
     
+    @timed
     @block_if_in_blocked_mode
-    def balance(self, update: Update, context: CallbackContext) -> None:
+    async def balance(self, update: Update, context: CallbackContext) -> None:
         """
         /balance - command to show the current balance. First and only context argument 
         can set new balance if it's a valid number.
         """
 
+        model = await self.model_for(update)
         # no context - show balance
         if len(context.args) == 0:
-            balance = self.model.get_balance()
-            self.view.balance(update, balance)
+            balance = await self.run_blocking(model.get_balance)
+            await self.view.balance(update, balance)
         # 1 numeric argument - set new balance
         elif len(context.args) == 1 and isfloat(context.args[0]):
-            balance = self.model.get_balance()
             new_balance = float(context.args[0])
-            self.model.set_balance(new_balance)
-            self.view.balance(update, new_balance)
+            await self.run_blocking(model.set_balance, new_balance)
+            await self.view.balance(update, new_balance)
         # invalid command
         else:
-            self.view.reply(update, "Invalid /balance command")
+            await self.view.reply(update, "Invalid /balance command")
+
+    @timed
+    @block_if_in_blocked_mode
+    async def balance_at(self, update: Update, context: CallbackContext) -> None:
+        """/balance_at YYYY-MM-DD - command to show the balance at the end of a given day."""
+
+        if len(context.args) != 1:
+            await self.view.reply(update, "Invalid /balance_at command")
+            return
+        try:
+            day = date_from_str(context.args[0])
+        except ValueError:
+            await self.view.reply(update, f"Invalid date \"{context.args[0]}\", use YYYY-MM-DD")
+            return
+
+        model = await self.model_for(update)
+        balance = await self.run_blocking(model.db.balance_at, day + timedelta(days=1))
+        await self.view.balance_at(update, day, balance)
 
+    @timed
     @block_if_in_blocked_mode
-    def categories(self, update: Update, context: CallbackContext) -> None:
+    async def categories(self, update: Update, context: CallbackContext) -> None:
         """/categories - command to show current list of categories."""
 
-        categories = self.model.db.get_categories()
-        self.view.categories(update, categories)
+        model = await self.model_for(update)
+        categories = await self.run_blocking(model.db.get_categories)
+        await self.view.categories(update, categories)
     
+    @timed
     @block_if_in_blocked_mode
-    def cancel_last(self, update: Update, context: CallbackContext) -> None:
+    async def cancel_last(self, update: Update, context: CallbackContext) -> None:
         """/cancel_last - command to delete the last added expense."""
 
-        expense = self.model.db.delete_last_expense()
-        # return to previous balance
-        balance = self.model.get_balance()
-        self.model.set_balance(balance + expense.amount)
-        self.view.cancel(update, expense)
+        # delete expense and return to previous balance
+        model = await self.model_for(update)
+        expense = await self.run_blocking(model.db.delete_last_expense)
+        await self.view.cancel(update, expense)
     
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(CommandHandler("start", self.start, filters=self.user_filter))
-        dp.add_handler(CommandHandler("help", self.help, filters=self.user_filter))
-        dp.add_handler(CommandHandler("balance", self.balance, filters=self.user_filter))
-        dp.add_handler(CommandHandler("categories", self.categories, filters=self.user_filter))
-        dp.add_handler(CommandHandler("cancel_last", self.cancel_last, filters=self.user_filter))
+        app = self.application
+        app.add_handler(CommandHandler("start", self.start, filters=self.user_filter, block=False))
+        app.add_handler(CommandHandler("help", self.help, filters=self.user_filter, block=False))
+        app.add_handler(CommandHandler("balance", self.balance, filters=self.user_filter, block=False))
+        app.add_handler(CommandHandler("balance_at", self.balance_at, filters=self.user_filter, block=False))
+        app.add_handler(CommandHandler("categories", self.categories, filters=self.user_filter, block=False))
+        app.add_handler(CommandHandler("cancel_last", self.cancel_last, filters=self.user_filter, block=False))
 
 
 class MonthStat(Controller):
@@ -593,42 +748,51 @@ class MonthStat(Controller):
     MONTH = 0
     YEAR = 1
 
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        super().__init__(updater, user_filter, view, model)
-        # save chosen month between conversation states
-        self.mon = None
+    # key in context.user_data of the chosen month saved between conversation states
+    USER_DATA_KEY = "statistics_month"
     
-    def statistics(self, update: Update, date: datetime) -> None:
+    async def statistics(self, update: Update, date: datetime) -> None:
         """Construct MonthStatistics object based on a given date and send it to View."""
 
+        model = await self.model_for(update)
+        month_statistics = await self.run_blocking(self.month_statistics_of, model, date)
+        if month_statistics is None:
+            await self.view.reply(update, f"There were no expenses in month {date:%Y-%m}")
+            return
+
+        await self.view.month_statistics(update, month_statistics)
+
+    @staticmethod
+    def month_statistics_of(model: Model, date: datetime) -> MonthStatistics | None:
+        """
+        Read MonthStatistics of the month of a given date from a model (None if there were no expenses).
+        Blocking, so it is run in a worker thread.
+        """
+
         year = date.year
         month = date.month
 
-        expenses = self.model.db.expenses_in(date)
-        if not expenses:
-            self.view.reply(update, f"There were no expenses in month {date:%Y-%m}")
-            return
+        # aggregated by the database, without loading every expense
+        totals = model.db.category_totals_in(date)
+        if not totals:
+            return None
 
-        biggest = sorted(expenses, key=lambda exp: exp.amount, reverse=True)[:3]
+        biggest = model.db.biggest_expenses_in(date, 3)
 
-        statistics = {category: 0 for category in self.model.db.get_categories()}
-        for expense in expenses:
-            statistics[expense.category] += expense.amount
-        
-        if date.month > 1:
-            previous_month = datetime(date.year, date.month - 1, 1)
-        else:
-            previous_month = datetime(date.year - 1, 12, 1)
+        statistics = {category: 0 for category in model.db.get_categories()}
+        statistics.update(totals)
+
+        # balances from the transaction log, so they are known even without snapshots
+        start, end = month_range(date)
+        start_balance = model.db.balance_at(start)
 
-        start_balance = self.model.db.get_balance_from_history(previous_month)
-        
         now = datetime.now()
         if date.year == now.year and date.month == now.month:
-            end_balance = self.model.get_balance()
+            end_balance = model.get_balance()
         else:
-            end_balance = self.model.db.get_balance_from_history(date)
+            end_balance = model.db.balance_at(end)
         
-        month_statistics = MonthStatistics(
+        return MonthStatistics(
             year,
             month,
             statistics,
@@ -637,105 +801,114 @@ class MonthStat(Controller):
             end_balance
         )
 
-        self.view.month_statistics(update, month_statistics)   
-
+    @timed
     @block_if_in_blocked_mode
-    def month_statistics(self, update: Update, context: CallbackContext) -> int:
+    async def month_statistics(self, update: Update, context: CallbackContext) -> int:
         """/month_statistics - entry point to the conversation"""
 
-        self.view.reply(update, "Enter month number or /current_month")
+        await self.view.reply(update, "Enter month number or /current_month")
         
         return MonthStat.MONTH
     
-    def month(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def month(self, update: Update, context: CallbackContext) -> int:
         """Ask the user which month to analyze."""
 
         msg = update.message.text.lower()
         if not msg.isdigit():
-            self.view.reply(update, "Month must be an integer.")
+            await self.view.reply(update, "Month must be an integer.")
             return
 
         month = int(msg)
         if not (1 <= month <= 12):
-            self.view.reply(update, "Month must be between 1 and 12.")
+            await self.view.reply(update, "Month must be between 1 and 12.")
             return
 
-        self.mon = month
-        self.view.reply(update, "Enter year as YYYY or /current_year")
+        context.user_data[MonthStat.USER_DATA_KEY] = month
+        await self.view.reply(update, "Enter year as YYYY or /current_year")
 
         return MonthStat.YEAR
     
-    def year(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def year(self, update: Update, context: CallbackContext) -> int:
         """Ask the user which year the chosen month belongs to."""
 
         msg = update.message.text.lower()
         if not msg.isdigit():
-            self.view.reply(update, "Year must be an integer")
+            await self.view.reply(update, "Year must be an integer")
             return
 
         year = int(msg)
         if year > time_now().year:
-            self.view.reply(update, "Year must be not greater than current year.")
+            await self.view.reply(update, "Year must be not greater than current year.")
             return
         
-        date = datetime(year, self.mon, 1).replace(microsecond=0)
-        self.statistics(update, date)
-        self.mon = None
+        month = context.user_data.pop(MonthStat.USER_DATA_KEY)
+        date = datetime(year, month, 1).replace(microsecond=0)
+        await self.statistics(update, date)
         
         return ConversationHandler.END
     
-    def current_year(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def current_year(self, update: Update, context: CallbackContext) -> int:
         current = datetime.now()
-        date = datetime(current.year, self.mon, 1).replace(microsecond=0)
-        self.statistics(update, date)
-        self.mon = None
+        month = context.user_data.pop(MonthStat.USER_DATA_KEY)
+        date = datetime(current.year, month, 1).replace(microsecond=0)
+        await self.statistics(update, date)
 
         return ConversationHandler.END
     
-    def current_month(self, update: Update, context: CallbackContext) -> int:
+    @timed
+    async def current_month(self, update: Update, context: CallbackContext) -> int:
         current = datetime.now()
         date = datetime(current.year, current.month, 1)
-        self.statistics(update, date)
+        await self.statistics(update, date)
         
         return ConversationHandler.END
     
-    def cancel(self, update: Update, context: CallbackContext) -> int:
-        self.mon = None
-        self.view.reply(update, "Command cancelled.")
+    @timed
+    async def cancel(self, update: Update, context: CallbackContext) -> int:
+        context.user_data.pop(MonthStat.USER_DATA_KEY, None)
+        await self.view.reply(update, "Command cancelled.")
 
         return ConversationHandler.END
     
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(ConversationHandler(
+        app = self.application
+        app.add_handler(ConversationHandler(
             entry_points=[
                 CommandHandler(
                     "month_statistics",
                     self.month_statistics,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ],
             states={
                 MonthStat.MONTH: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.month
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.month,
+                        block=False
                     ),
                     CommandHandler(
                         "current_month",
                         self.current_month,
-                        filters=self.user_filter
+                        filters=self.user_filter,
+                        block=False
                     )
                 ],
                 MonthStat.YEAR: [
                     MessageHandler(
-                        Filters.text & (~Filters.command) & self.user_filter,
-                        self.year
+                        filters.TEXT & (~filters.COMMAND) & self.user_filter,
+                        self.year,
+                        block=False
                     ),
                     CommandHandler(
                         "current_year",
                         self.current_year,
-                        filters=self.user_filter
+                        filters=self.user_filter,
+                        block=False
                     )
                 ]
             },
@@ -743,22 +916,138 @@ class MonthStat(Controller):
                 CommandHandler(
                     "cancel",
                     self.cancel,
-                    filters=self.user_filter
+                    filters=self.user_filter,
+                    block=False
                 )
             ]
         ))
 
 
+class RangeStat(Controller):
+
+    @staticmethod
+    def range_statistics_of(model: Model, start: datetime, end: datetime) -> RangeStatistics | None:
+        """
+        Read RangeStatistics of expenses between start (inclusive) and end (exclusive) from a model
+        (None if there were no expenses). Blocking, so it is run in a worker thread.
+        """
+
+        # the whole range in one query, aggregated by numpy
+        batch = model.db.expense_batch(start, end)
+        if not batch:
+            return None
+
+        month_labels = months_between(start, end)
+        category_labels, matrix = month_category_matrix(batch, month_labels)
+        # months still ahead (e.g. of the current year) aren't counted into averages
+        current_month = f"{datetime.now():%Y-%m}"
+        months_begun = sum(1 for month in month_labels if month <= current_month)
+
+        start_balance = model.db.balance_at(start)
+        if end > datetime.now():
+            end_balance = model.get_balance()
+        else:
+            end_balance = model.db.balance_at(end)
+
+        return RangeStatistics(
+            start,
+            end,
+            month_labels,
+            months_begun,
+            category_labels,
+            matrix,
+            start_balance,
+            end_balance
+        )
+
+    async def statistics(self, update: Update, title: str, start: datetime, end: datetime) -> None:
+        """Construct RangeStatistics object of a given range and send it to View."""
+
+        model = await self.model_for(update)
+        range_statistics = await self.run_blocking(self.range_statistics_of, model, start, end)
+        if range_statistics is None:
+            await self.view.reply(update, f"There were no expenses in {title}")
+            return
+
+        await self.view.range_statistics(update, title, range_statistics)
+
+    @timed
+    @block_if_in_blocked_mode
+    async def year_statistics(self, update: Update, context: CallbackContext) -> None:
+        """/year_statistics [YYYY] - command to show statistics of a year (the current one by default)."""
+
+        if len(context.args) == 0:
+            year = time_now().year
+        elif len(context.args) == 1 and context.args[0].isdigit():
+            year = int(context.args[0])
+        else:
+            await self.view.reply(update, "Invalid /year_statistics command")
+            return
+
+        if not (1 <= year <= time_now().year):
+            await self.view.reply(update, "Year must be not greater than current year.")
+            return
+
+        await self.statistics(update, str(year), datetime(year, 1, 1), datetime(year + 1, 1, 1))
+
+    @timed
+    @block_if_in_blocked_mode
+    async def range_statistics(self, update: Update, context: CallbackContext) -> None:
+        """/range_statistics YYYY-MM-DD YYYY-MM-DD - command to show statistics between two dates inclusively."""
+
+        if len(context.args) != 2:
+            await self.view.reply(update, "Invalid /range_statistics command")
+            return
+        try:
+            start, last = map(date_from_str, context.args)
+        except ValueError:
+            await self.view.reply(update, "Dates must be given as YYYY-MM-DD")
+            return
+        if last < start:
+            await self.view.reply(update, "Start date must be before end date.")
+            return
+
+        title = f"{start:%Y-%m-%d} - {last:%Y-%m-%d}"
+        await self.statistics(update, title, start, last + timedelta(days=1))
+
+    def add_handlers(self) -> None:
+        app = self.application
+        app.add_handler(CommandHandler("year_statistics", self.year_statistics, filters=self.user_filter, block=False))
+        app.add_handler(CommandHandler("range_statistics", self.range_statistics, filters=self.user_filter, block=False))
+
+
+class Monitoring(Controller):
+    """Commands for admins of the bot (its user_filter lets only admins through)."""
+
+    @timed
+    async def metrics(self, update: Update, context: CallbackContext) -> None:
+        """/metrics - command to show call counts and latencies of handlers."""
+
+        await self.view.metrics(update, METRICS)
+
+    def add_handlers(self) -> None:
+        app = self.application
+        app.add_handler(CommandHandler("metrics", self.metrics, filters=self.user_filter, block=False))
+
+
 class MasterController(Controller):
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        super().__init__(updater, user_filter, view, model)
-        self.plain_callbacks = PlainCallbacks(updater, user_filter, view, model)
-        self.add_expense = AddExpense(updater, user_filter, view, model)
-        self.add_income = AddIncome(updater, user_filter, view, model)
-        self.add_category = AddCategory(updater, user_filter, view, model)
-        self.update_category = UpdateCategory(updater, user_filter, view, model)
-        self.delete_category = DeleteCategory(updater, user_filter, view, model)
-        self.month_stat = MonthStat(updater, user_filter, view, model)
+    def __init__(self, application: Application, user_filter: BaseFilter, view: View, models: ModelRegistry, admin_filter: BaseFilter | None = None) -> None:
+        """admin_filter lets through users allowed to use admin commands (all users if not given)."""
+
+        super().__init__(application, user_filter, view, models)
+        # /block switches off commands of all users, so it is an admin command
+        self.admin_filter = admin_filter or user_filter
+        self.plain_callbacks = PlainCallbacks(application, user_filter, view, models)
+        self.add_expense = AddExpense(application, user_filter, view, models)
+        self.add_income = AddIncome(application, user_filter, view, models)
+        self.add_category = AddCategory(application, user_filter, view, models)
+        self.update_category = UpdateCategory(application, user_filter, view, models)
+        self.delete_category = DeleteCategory(application, user_filter, view, models)
+        self.month_stat = MonthStat(application, user_filter, view, models)
+        self.range_stat = RangeStat(application, user_filter, view, models)
+        self.import_transactions = ImportTransactions(application, user_filter, view, models)
+        self.export_transactions = ExportTransactions(application, user_filter, view, models)
+        self.monitoring = Monitoring(application, self.admin_filter, view, models)
         self.controllers: list[Controller] = [
             self.plain_callbacks,
             self.add_expense,
@@ -766,35 +1055,104 @@ class MasterController(Controller):
             self.add_category,
             self.update_category,
             self.delete_category,
-            self.month_stat
+            self.month_stat,
+            self.range_stat,
+            self.import_transactions,
+            self.export_transactions,
+            self.monitoring
         ]
 
-    def block(self, update: Update, context: CallbackContext) -> None:
-        """/block command - block all commands from executing until next /block."""
+    @timed
+    async def block(self, update: Update, context: CallbackContext) -> None:
+        """/block command (admins only) - block all commands of all users from executing until next /block."""
 
         for controller in self.controllers:
             controller.blocked_mode = not controller.blocked_mode
 
     def add_handlers(self) -> None:
-        dp = self.updater.dispatcher
-        dp.add_handler(CommandHandler("block", self.block, filters=self.user_filter))
+        app = self.application
+        app.add_handler(CommandHandler("block", self.block, filters=self.admin_filter, block=False))
 
-    def start_bot(self, poll_interval: float, timeout: float) -> None:
-        """
-        Create all data files if the don't exist yet,
-        initialize handlers in controllers 
-        and start polling updates from Telegram servers.
-        """
-
-        # create DB and balance files if they don't exist yet
-        self.model.setup()
+    def register_handlers(self) -> None:
+        """Add handlers of all controllers to the application."""
 
-        # add handlers of all controllers to the dispatcher
         self.add_handlers()
         for controller in self.controllers:
             controller.add_handlers()
+
+    def add_profile_handler(self, profile: StartupProfile) -> None:
+        """Print the startup profile after the first update is handled by other handlers."""
+
+        reported = False
+
+        async def first_update(update: Update, context: CallbackContext) -> None:
+            nonlocal reported
+            if not reported:
+                reported = True
+                profile.mark("first update")
+                print(profile.report())
+
+        # group after the default one (0), so it runs once handlers of the update are started
+        self.application.add_handler(TypeHandler(Update, first_update), group=1)
+
+    async def serve_webhook(self, webhook: WebhookServer) -> None:
+        """
+        Register the webhook at Telegram and handle updates received by the server
+        until SIGINT or SIGTERM.
+        """
+
+        app = self.application
+        async with app:
+            if app.post_init is not None:
+                await app.post_init(app)
+            await app.bot.set_webhook(webhook.url, secret_token=webhook.secret_token)
+            await app.start()
+            await webhook.start()
+
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                loop.add_signal_handler(sig, stop.set)
+            await stop.wait()
+
+            await webhook.stop()
+            await app.stop()
+
+    def start_bot(self, poll_interval: float, timeout: float, user_ids: Iterable[int] = (), profile: StartupProfile | None = None, webhook: WebhookServer | None = None) -> None:
+        """
+        Open models of given users up front (creating their data files if they don't exist yet),
+        initialize handlers in controllers 
+        and poll updates from Telegram servers (or receive them by a webhook server if given)
+        until the bot is stopped.
+        Models of other users are opened on their first update.
+        If a profile is given, startup stages are recorded into it
+        and it is printed once the first update is handled.
+        """
+
+        # create and migrate DBs if needed
+        for user_id in user_ids:
+            with self.models.lease(user_id):
+                pass
+        if profile is not None:
+            profile.mark("model setup")
+
+        self.register_handlers()
+        if profile is not None:
+            profile.mark("handler registration")
+            self.add_profile_handler(profile)
         
-        # start polling updates from Telegram servers
         print("Bot running...")
-        self.updater.start_polling(poll_interval=poll_interval, timeout=timeout)
-        self.updater.idle()
\ No newline at end of file
+        if webhook is not None:
+            # Telegram sends every update as soon as it arrives
+            if profile is not None:
+                profile.mark("webhook start")
+            asyncio.run(self.serve_webhook(webhook))
+        else:
+            # poll updates from Telegram servers in the event loop until stopped (e.g. by Ctrl+C)
+            if profile is not None:
+                profile.mark("polling start")
+            self.application.run_polling(poll_interval=poll_interval, timeout=timeout)
+
+        # close database connections and chart workers once the application is stopped
+        self.models.close()
+        self.view.close()
\ No newline at end of file
@@ -1,39 +1,75 @@
+import asyncio
+import functools
 from abc import ABC, abstractmethod
-from typing import Callable
+from typing import Any, Awaitable, Callable
 
-from telegram.update import Update
-from telegram.ext import Updater, CallbackContext, BaseFilter
+from telegram import Update
+from telegram.ext import Application, CallbackContext
+from telegram.ext.filters import BaseFilter
 
 from ..view import View
 from ..model import Model
+from ..model_registry import ModelRegistry
+from .metrics import phase
 
 
 class Controller(ABC):
     """This abstract class represents a controller in an MVC-architecture."""
 
-    def __init__(self, updater: Updater, user_filter: BaseFilter, view: View, model: Model) -> None:
-        self.updater = updater
+    def __init__(self, application: Application, user_filter: BaseFilter, view: View, models: ModelRegistry) -> None:
+        self.application = application
         self.user_filter = user_filter
         self.view = view
-        self.model = model
+        self.models = models
         self.blocked_mode = False
-    
+
+    async def model_for(self, update: Update) -> Model:
+        """
+        Get Model of the user who sent the update (opening it in a worker thread if needed).
+        It is leased until the task of the handler finishes, so it isn't closed while in use.
+        """
+
+        user_id = update.effective_user.id
+        model = await self.run_blocking(self.models.acquire, user_id)
+
+        def release(task: asyncio.Task) -> None:
+            # releasing may close an evicted model, which waits for its writer thread
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self.models.release, user_id)
+            except RuntimeError:
+                # the executor is already shut down
+                self.models.release(user_id)
+
+        asyncio.current_task().add_done_callback(release)
+        return model
+
+    @staticmethod
+    async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking call (database access) in the default executor of the event loop,
+        so other updates are handled while it runs.
+        """
+
+        with phase("db"):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
     @abstractmethod
     def add_handlers(self) -> None:
-        """This method should add all needed telegram Handlers to the Updater.Dispatcher"""
+        """This method should add all needed telegram Handlers to the Application"""
         ...
 
 
-def block_if_in_blocked_mode(func: Callable[[Controller, Update, CallbackContext], int | None]):
+def block_if_in_blocked_mode(func: Callable[[Controller, Update, CallbackContext], Awaitable[int | None]]):
     """
     Execute a given method of a controller if it is not in blocked mode,
     otherwise do nothing.
     """
 
-    def wrapper(ctr: Controller, update: Update, context: CallbackContext):
+    @functools.wraps(func)
+    async def wrapper(ctr: Controller, update: Update, context: CallbackContext):
         if ctr.blocked_mode:
             return
         else:
-            return func(ctr, update, context)
-            
-    return wrapper
\ No newline at end of file
+            return await func(ctr, update, context)
+
+    return wrapper
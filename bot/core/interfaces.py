@@ -1,8 +1,9 @@
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Expense:
     amount: float
     category: str
@@ -10,22 +11,74 @@ class Expense:
     time: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Income:
     amount: float
     description: str
     time: datetime
 
 
-@dataclass
+@dataclass(slots=True)
+class ExpenseBatch:
+    """
+    Expenses stored as columns of machine values instead of one Expense object per row:
+    amounts, times (seconds since 1970-01-01 of naive local times) and category ids (indexes of categories).
+    Descriptions aren't kept.
+    """
+
+    categories: list[str] = field(default_factory=list)
+    amounts: array = field(default_factory=lambda: array("d"))
+    times: array = field(default_factory=lambda: array("q"))
+    category_ids: array = field(default_factory=lambda: array("i"))
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+
+@dataclass(slots=True)
 class MonthStatistics:
     year: int
     month: int
     statistics: dict[str, float]
     biggest_expenses: list[Expense]
+    start_balance: float | None
+    end_balance: float | None
+
+    @property
+    def balance_difference(self) -> float | None:
+        if self.start_balance is None or self.end_balance is None:
+            return None
+        return self.end_balance - self.start_balance
+
+
+@dataclass(slots=True)
+class RangeStatistics:
+    start: datetime
+    end: datetime
+    # labels of rows ("YYYY-MM", every month of the range) and columns of amounts
+    months: list[str]
+    # number of months of the range which have begun (later ones are in the future)
+    months_begun: int
+    categories: list[str]
+    # amount spent per month (rows) and category (columns)
+    amounts: list[list[float]]
     start_balance: float
     end_balance: float
 
+    @property
+    def category_totals(self) -> dict[str, float]:
+        return {category: sum(row[i] for row in self.amounts) for i, category in enumerate(self.categories)}
+
+    @property
+    def month_totals(self) -> dict[str, float]:
+        return {month: sum(row) for month, row in zip(self.months, self.amounts)}
+
+    @property
+    def average_per_month(self) -> float:
+        """Total amount spent divided by months of the range that have begun."""
+
+        return sum(self.month_totals.values()) / max(self.months_begun, 1)
+
     @property
     def balance_difference(self) -> float:
-        return self.end_balance - self.start_balance
\ No newline at end of file
+        return self.end_balance - self.start_balance
@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from telegram.ext import CallbackContext, Job, JobQueue
+
+# upper bounds (seconds) of latency histogram buckets, the last bucket is unbounded
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# parts of handling an update measured separately (besides the total time)
+PHASES = ["db", "render", "send"]
+
+# durations of phases of the handler call running in the current context
+_phases: ContextVar[dict[str, float] | None] = ContextVar("phases", default=None)
+
+
+class Histogram:
+    """Counts of observed durations per bucket of BUCKETS, with their sum."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, duration: float) -> None:
+        self.counts[bisect_left(BUCKETS, duration)] += 1
+        self.sum += duration
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the q-quantile (inf if it's in the last bucket)."""
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class HandlerStats:
+    """Number of calls and errors of a handler and histograms of the total time and of every phase."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.histograms = {phase: Histogram() for phase in ["total"] + PHASES}
+
+
+class Metrics:
+    """Thread-safe collection of HandlerStats by handler name."""
+
+    def __init__(self) -> None:
+        self.handlers: dict[str, HandlerStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, handler: str, total: float, phases: dict[str, float], error: bool) -> None:
+        with self._lock:
+            stats = self.handlers.setdefault(handler, HandlerStats())
+            stats.calls += 1
+            stats.errors += error
+            stats.histograms["total"].observe(total)
+            # phases which didn't happen during a call aren't observed
+            for phase, duration in phases.items():
+                stats.histograms[phase].observe(duration)
+
+    def prometheus_text(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+
+        lines = [
+            "# HELP bot_handler_calls_total Number of updates handled per handler.",
+            "# TYPE bot_handler_calls_total counter"
+        ]
+        with self._lock:
+            handlers = sorted(self.handlers.items())
+            for name, stats in handlers:
+                lines.append(f'bot_handler_calls_total{{handler="{name}"}} {stats.calls}')
+
+            lines.append("# HELP bot_handler_errors_total Number of handler calls which raised an exception.")
+            lines.append("# TYPE bot_handler_errors_total counter")
+            for name, stats in handlers:
+                lines.append(f'bot_handler_errors_total{{handler="{name}"}} {stats.errors}')
+
+            lines.append("# HELP bot_handler_duration_seconds Time spent by handlers, in total and per phase.")
+            lines.append("# TYPE bot_handler_duration_seconds histogram")
+            for name, stats in handlers:
+                for phase, histogram in stats.histograms.items():
+                    labels = f'handler="{name}",phase="{phase}"'
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f'bot_handler_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"bot_handler_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"bot_handler_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path: str | Path) -> None:
+        """Write metrics into a file atomically (readers never see a half-written file)."""
+
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+# metrics of all handlers of the bot
+METRICS = Metrics()
+
+
+@contextmanager
+def phase(name: str):
+    """Add time spent in the block to a phase of the handler call running in the current context (if any)."""
+
+    phases = _phases.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if phases is not None:
+            phases[name] = phases.get(name, 0) + time.perf_counter() - start
+
+
+def timed(func: Callable[..., Awaitable]):
+    """
+    Record the number of calls, errors and durations (total and per phase)
+    of a given handler method of a controller into METRICS.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(ctr, update, context):
+        name = f"{type(ctr).__name__}.{func.__name__}"
+        phases = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        error = False
+        try:
+            return await func(ctr, update, context)
+        except Exception:
+            error = True
+            raise
+        finally:
+            _phases.reset(token)
+            METRICS.record(name, time.perf_counter() - start, phases, error)
+
+    return wrapper
+
+
+async def write_metrics_file(context: CallbackContext) -> None:
+    """Job writing METRICS into the Prometheus file at the path given in its data."""
+
+    await asyncio.to_thread(METRICS.write_prometheus_file, context.job.data)
+
+
+def schedule_metrics_file(job_queue: JobQueue, path: str | Path, interval: float = 60) -> Job:
+    """Write METRICS into a Prometheus text file (for node_exporter's textfile collector) every interval seconds."""
+
+    return job_queue.run_repeating(write_metrics_file, interval=interval, first=interval, data=path, name="metrics file")
@@ -0,0 +1,30 @@
+import time
+
+
+class StartupProfile:
+    """Measures how long each stage of the bot startup takes."""
+
+    def __init__(self, start: float | None = None) -> None:
+        # perf_counter() value the profile starts from
+        self.start = start if start is not None else time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+        self._last = self.start
+
+    def mark(self, stage: str, at: float | None = None) -> None:
+        """
+        Record the end of a stage that started with the previous mark
+        (ending now or at a given earlier perf_counter() value).
+        """
+
+        now = at if at is not None else time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        """Stage durations and total time from the start, in milliseconds."""
+
+        lines = ["Startup profile:"]
+        for stage, duration in self.stages:
+            lines.append(f"{stage:<24}{duration * 1000:>10.1f} ms")
+        lines.append(f"{'total':<24}{(self._last - self.start) * 1000:>10.1f} ms")
+        return "\n".join(lines)
@@ -19,6 +19,23 @@ def time_from_str(string: str) -> datetime:
     return datetime.strptime(string, "%Y-%m-%d %H:%M:%S")
 
 
+def date_from_str(string: str) -> datetime:
+    """Parse a "YYYY-MM-DD" string into a datetime object (at midnight)."""
+
+    return datetime.strptime(string, "%Y-%m-%d")
+
+
+def month_range(date: datetime) -> tuple[datetime, datetime]:
+    """Get start of the month of a given date and start of the next month."""
+
+    start = datetime(date.year, date.month, 1)
+    if start.month < 12:
+        end = datetime(start.year, start.month + 1, 1)
+    else:
+        end = datetime(start.year + 1, 1, 1)
+    return start, end
+
+
 def isfloat(string: str) -> bool:
     """Whether a string is a valid number."""
 
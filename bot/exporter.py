@@ -0,0 +1,57 @@
+import csv
+import gzip
+import json
+from pathlib import Path
+from typing import Iterable, TextIO
+
+# columns of exported files (also understood by the importer)
+FIELDS = ["type", "amount", "category", "description", "time"]
+
+
+def export_format(path: str | Path) -> tuple[str, bool]:
+    """Get export format ("csv" or "jsonl") and whether to gzip it from a file name like "data.csv.gz"."""
+
+    suffixes = [suffix.lower() for suffix in Path(path).suffixes]
+    compress = bool(suffixes) and suffixes[-1] == ".gz"
+    if compress:
+        suffixes.pop()
+
+    if not suffixes or suffixes[-1] not in [".csv", ".jsonl"]:
+        raise ValueError(f"Unsupported file name \"{Path(path).name}\", expected .csv, .jsonl, .csv.gz or .jsonl.gz")
+    return suffixes[-1][1:], compress
+
+
+def write_rows(rows: Iterable[tuple], f: TextIO, fmt: str) -> int:
+    """Write rows one by one into a text file in a given format. Returns number of rows."""
+
+    count = 0
+    match fmt:
+        case "csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        case "jsonl":
+            for row in rows:
+                f.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False))
+                f.write("\n")
+                count += 1
+        case _:
+            raise ValueError(f"Unsupported export format \"{fmt}\"")
+    return count
+
+
+def export_to_file(rows: Iterable[tuple], path: str | Path) -> int:
+    """
+    Stream rows into a file (format is taken from its name, see export_format).
+    Returns number of exported rows.
+    """
+
+    fmt, compress = export_format(path)
+    if compress:
+        with gzip.open(path, "wt", encoding="utf8", newline="") as f:
+            return write_rows(rows, f, fmt)
+    else:
+        with open(path, "w", encoding="utf8", newline="") as f:
+            return write_rows(rows, f, fmt)
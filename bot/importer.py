@@ -0,0 +1,72 @@
+import csv
+import gzip
+import json
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from .core.interfaces import Expense, Income
+
+
+def read_rows(path: str | Path) -> Iterator[dict]:
+    """Stream rows of a .csv (with a header) or .jsonl file (optionally gzipped) one by one."""
+
+    path = Path(path)
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    opener = open
+    if suffixes and suffixes[-1] == ".gz":
+        opener = gzip.open
+        suffixes.pop()
+
+    match suffixes[-1] if suffixes else "":
+        case ".csv":
+            with opener(path, "rt", encoding="utf8", newline="") as f:
+                yield from csv.DictReader(f)
+        case ".jsonl":
+            with opener(path, "rt", encoding="utf8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        case _:
+            raise ValueError(f"Unsupported file \"{path.name}\", expected .csv or .jsonl (optionally .gz)")
+
+
+def transaction_from_row(row: dict) -> Expense | Income:
+    """
+    Map a row with "amount", "time" and optional "type", "category" and "description"
+    columns into an Expense or Income. Without a type ("expense" or "income"),
+    negative amounts are expenses and positive ones are incomes.
+    """
+
+    try:
+        amount = float(row["amount"])
+        time = datetime.fromisoformat(str(row["time"]).strip()).replace(microsecond=0, tzinfo=None)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid row {row}") from e
+    # "nan" and "inf" are parsed by float, but aren't amounts
+    if not math.isfinite(amount):
+        raise ValueError(f"Invalid amount in row {row}")
+
+    kind = (row.get("type") or "").lower()
+    if not kind:
+        kind = "expense" if amount < 0 else "income"
+    description = row.get("description") or None
+
+    match kind:
+        case "expense":
+            category = (row.get("category") or "other").lower()
+            return Expense(abs(amount), category, description, time)
+        case "income":
+            return Income(abs(amount), description or "", time)
+        case _:
+            raise ValueError(f"Invalid transaction type \"{kind}\" in row {row}")
+
+
+def transactions_from_file(path: str | Path) -> Iterator[Expense | Income]:
+    """Stream Expense and Income objects from a .csv or .jsonl file (balance rows of exports are skipped)."""
+
+    for row in read_rows(path):
+        if (row.get("type") or "").lower() == "balance":
+            continue
+        yield transaction_from_row(row)
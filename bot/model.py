@@ -1,32 +1,246 @@
 import sqlite3
 import os
 import json
-from datetime import datetime
+import threading
+import hashlib
+import queue
+import functools
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from concurrent.futures import Future
+from itertools import islice
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 from contextlib import contextmanager
-from dataclasses import asdict
+from dataclasses import asdict, replace
 
-from .core.interfaces import Expense, Income
-from .core.utils import time_from_str
+from .core.interfaces import Expense, ExpenseBatch, Income
+from .core.utils import time_now, time_from_str, str_from_time, month_range, split_in_rows
+from .importer import transactions_from_file
+from .exporter import export_to_file
+from .sql_trace import SqlTracer, TracingConnection
+
+# times are stored as "YYYY-MM-DD HH:MM:SS" strings in DATE columns, a column selected
+# as `time AS "time [DATE]"` is returned as a datetime (connections use PARSE_COLNAMES)
+sqlite3.register_converter("DATE", lambda value: datetime.fromisoformat(value.decode()))
+
+# columns of expenses turned into Expense objects by _expense_from_row
+EXPENSE_COLUMNS = 'amount, category_name, description, time AS "time [DATE]"'
+
+
+def _expense_from_row(cursor: sqlite3.Cursor, row: tuple) -> Expense:
+    """Row factory building an Expense from a row of EXPENSE_COLUMNS."""
+
+    amount, category, description, time = row
+    # empty descriptions are stored as "" by older versions
+    return Expense(amount, category, description or None, time)
+
+
+def write_operation(method: Callable) -> Callable:
+    """
+    Execute a given method of a Database on its writer thread if it is started,
+    otherwise in the calling thread.
+    """
+
+    @functools.wraps(method)
+    def wrapper(db: "Database", *args, **kwargs):
+        return db._write(method, db, *args, **kwargs)
+
+    return wrapper
 
 
 class Database:
-    def __init__(self, path: str | Path) -> None:
+    # executed once on every newly opened connection
+    PRAGMAS = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA foreign_keys = 1",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -8000"
+    ]
+
+    def __init__(self, path: str | Path, *, tracer: SqlTracer | None = None) -> None:
         self.path = path
+        # logs statements of all connections if given
+        self.tracer = tracer
+        # one long-lived connection per thread (keyed by thread id)
+        self._connections: dict[int, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        # nesting depth of connection() blocks and callbacks
+        # waiting for the commit in the current thread
+        self._local = threading.local()
+
+        # in-memory copy of categories, reloaded on first read after a change
+        self._categories: list[str] | None = None
+        self._category_set: frozenset[str] = frozenset()
+        self._category_rows: dict[int, list[list[str]]] = {}
+        self._categories_lock = threading.RLock()
+
+        # committed balance, reloaded on first read after a change
+        self._balance: float | None = None
+        self._balance_lock = threading.Lock()
+
+        # thread executing all write operations (if started) and their queue
+        self._writer: threading.Thread | None = None
+        self._write_queue: queue.Queue[tuple | None] = queue.Queue()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply PRAGMAS to it."""
+
+        if self.tracer is not None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, detect_types=sqlite3.PARSE_COLNAMES, factory=TracingConnection)
+            self.tracer.install(conn)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, detect_types=sqlite3.PARSE_COLNAMES)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Get the connection of the current thread, opening it on first use."""
+
+        thread_id = threading.get_ident()
+        conn = self._connections.get(thread_id)
+        if conn is None:
+            conn = self._connect()
+            with self._connections_lock:
+                self._connections[thread_id] = conn
+        return conn
 
     @contextmanager
     def connection(self):
         """
-        Connect to the database with foreign keys enabled,
-        then commit and close the connection.
+        Get a cursor on the connection of the current thread.
+        Nested blocks share one transaction: it is committed when
+        the outermost block exits and rolled back on an exception.
         """
 
-        conn = sqlite3.connect(self.path)
-        conn.execute("PRAGMA foreign_keys = 1")
+        conn = self._thread_connection()
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._local.on_commit = []
+        self._local.depth = depth + 1
+        cursor = conn.cursor()
         try:
-            yield conn.cursor()
+            yield cursor
+        except BaseException:
+            if depth == 0:
+                conn.rollback()
+            raise
+        else:
+            if depth == 0:
+                conn.commit()
+                for callback in self._local.on_commit:
+                    callback()
         finally:
-            conn.commit()
+            self._local.depth = depth
+            cursor.close()
+
+    @staticmethod
+    def _fetch_expenses(cursor: sqlite3.Cursor, query: str, params: tuple = ()) -> list[Expense]:
+        """Execute a query selecting EXPENSE_COLUMNS and get its rows as Expense objects."""
+
+        cursor.row_factory = _expense_from_row
+        try:
+            return cursor.execute(query, params).fetchall()
+        finally:
+            cursor.row_factory = None
+
+    def _on_commit(self, callback: Callable[[], None]) -> None:
+        """Call a function after the current transaction is committed (dropped on rollback)."""
+
+        self._local.on_commit.append(callback)
+
+    def start_writer(self, max_batch: int = 64) -> None:
+        """
+        Start a thread which executes all write operations from now on. Writes queued
+        by concurrent threads are executed in groups of up to max_batch in one transaction
+        (each write in its own savepoint), so a single commit serves the whole group.
+        """
+
+        if self._writer is not None:
+            return
+        self._writer = threading.Thread(target=self._write_loop, args=(max_batch,), name="database-writer", daemon=True)
+        self._writer.start()
+
+    def _write(self, func: Callable, *args, **kwargs):
+        """Execute a write operation on the writer thread (waiting for its commit) or directly."""
+
+        # executed directly if there is no writer, or within an already open
+        # transaction of this thread, which the writer would have to wait for
+        if (self._writer is None
+                or threading.current_thread() is self._writer
+                or getattr(self._local, "depth", 0) > 0):
+            return func(*args, **kwargs)
+
+        future = Future()
+        self._write_queue.put((func, args, kwargs, future))
+        return future.result()
+
+    def _write_loop(self, max_batch: int) -> None:
+        """Execute queued write operations in groups until None is queued."""
+
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                return
+
+            # take whatever else is already waiting
+            batch = [item]
+            while len(batch) < max_batch:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write_queue.put(None)
+                    break
+                batch.append(item)
+
+            results = []
+            try:
+                with self.connection() as cursor:
+                    # otherwise the first savepoint opens the transaction
+                    # and its release commits every write separately
+                    if not cursor.connection.in_transaction:
+                        cursor.execute("BEGIN")
+                    for func, args, kwargs, future in batch:
+                        # failed write is rolled back alone, others are still committed
+                        cursor.execute("SAVEPOINT write_operation")
+                        try:
+                            result = func(*args, **kwargs)
+                        except Exception as e:
+                            cursor.execute("ROLLBACK TO write_operation")
+                            results.append((future, None, e))
+                        else:
+                            results.append((future, result, None))
+                        cursor.execute("RELEASE write_operation")
+            except Exception as e:
+                # commit failed, so none of the writes happened
+                results = [(future, None, e) for _, _, _, future in batch]
+
+            # results are given out only after the commit
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    def close(self) -> None:
+        """
+        Stop the writer thread (after it executes queued writes)
+        and close connections of all threads (they are reopened on next use).
+        """
+
+        if self._writer is not None:
+            self._write_queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
             conn.close()
     
     def create_schema(self) -> None:
@@ -75,6 +289,379 @@ class Database:
                 """
             )
 
+    def migrations(self) -> list[Callable[[sqlite3.Cursor], None]]:
+        """
+        Schema changes made after the initial schema, in order.
+        The "user_version" of a database file is the number of applied migrations.
+        """
+
+        return [
+            self._index_expense_time,
+            self._index_balance_history_time,
+            self._create_balance,
+            self._create_monthly_category_totals,
+            self._add_import_hashes,
+            self._index_income_time,
+            self._create_daily_totals
+        ]
+
+    def migrate(self) -> None:
+        """Apply all migrations the database file doesn't have yet (in one transaction)."""
+
+        with self.connection() as cursor:
+            cursor.execute("PRAGMA user_version")
+            version = cursor.fetchone()[0]
+            pending = self.migrations()[version:]
+            if not pending:
+                return
+
+            # DDL statements don't open a transaction implicitly
+            if not cursor.connection.in_transaction:
+                cursor.execute("BEGIN")
+            for number, migration in enumerate(pending, start=version + 1):
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+
+    def _index_expense_time(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Normalize all stored times to "YYYY-MM-DD HH:MM:SS" strings
+        (so they compare in chronological order) and index expenses by time.
+        """
+
+        for table in ["expenses", "incomes", "balance_history"]:
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET time = strftime('%Y-%m-%d %H:%M:%S', time)
+                WHERE time IS NOT strftime('%Y-%m-%d %H:%M:%S', time)
+                """
+            )
+        cursor.execute(
+            """
+            CREATE INDEX expenses_time_idx
+            ON expenses (time, category_name, amount)
+            """
+        )
+
+    def _index_balance_history_time(self, cursor: sqlite3.Cursor) -> None:
+        """Index balance snapshots by time (covering the amount)."""
+
+        cursor.execute(
+            """
+            CREATE INDEX balance_history_time_idx
+            ON balance_history (time, amount)
+            """
+        )
+
+    def _create_balance(self, cursor: sqlite3.Cursor) -> None:
+        """Keep current balance in a single-row table (starting with 0)."""
+
+        cursor.execute(
+            """
+            CREATE TABLE balance (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                amount REAL NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO balance VALUES (0, 0)
+            """
+        )
+
+    def _create_monthly_category_totals(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Create rollup of expenses per (year, month, category), kept up to date by triggers
+        in the same transaction as changes of expenses (including category renames
+        and deletions cascaded by foreign keys), and fill it in from existing expenses.
+        """
+
+        cursor.execute(
+            """
+            CREATE TABLE monthly_category_totals (
+                year INTEGER,
+                month INTEGER,
+                category_name TEXT,
+                amount REAL NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (year, month, category_name)
+            ) WITHOUT ROWID
+            """
+        )
+
+        # statements adding NEW row to the rollup and removing OLD row from it
+        add_new = """
+            INSERT INTO monthly_category_totals
+            VALUES (
+                CAST(strftime('%Y', NEW.time) AS INTEGER),
+                CAST(strftime('%m', NEW.time) AS INTEGER),
+                NEW.category_name,
+                NEW.amount,
+                1
+            )
+            ON CONFLICT (year, month, category_name) DO UPDATE
+            SET amount = amount + excluded.amount, count = count + 1;
+        """
+        remove_old = """
+            UPDATE monthly_category_totals
+            SET amount = amount - OLD.amount, count = count - 1
+            WHERE year = CAST(strftime('%Y', OLD.time) AS INTEGER)
+            AND month = CAST(strftime('%m', OLD.time) AS INTEGER)
+            AND category_name = OLD.category_name;
+
+            DELETE FROM monthly_category_totals
+            WHERE year = CAST(strftime('%Y', OLD.time) AS INTEGER)
+            AND month = CAST(strftime('%m', OLD.time) AS INTEGER)
+            AND category_name = OLD.category_name
+            AND count = 0;
+        """
+        cursor.execute(
+            f"""
+            CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expenses
+            BEGIN {add_new} END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expenses
+            BEGIN {remove_old} END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER expenses_rollup_update AFTER UPDATE OF amount, category_name, time ON expenses
+            BEGIN {remove_old} {add_new} END
+            """
+        )
+
+        self._fill_monthly_category_totals(cursor)
+
+    def _fill_monthly_category_totals(self, cursor: sqlite3.Cursor) -> None:
+        """Replace contents of the rollup with totals computed from expenses."""
+
+        cursor.execute(
+            """
+            DELETE FROM monthly_category_totals
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO monthly_category_totals
+            SELECT
+                CAST(strftime('%Y', time) AS INTEGER),
+                CAST(strftime('%m', time) AS INTEGER),
+                category_name,
+                SUM(amount),
+                COUNT(*)
+            FROM expenses
+            GROUP BY 1, 2, 3
+            """
+        )
+
+    def _create_daily_totals(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Create net change of balance (incomes - expenses) per day with running totals
+        ("cumulative" is the net change of all days up to and including the day),
+        so the net change before any time takes a single seek.
+        Net changes are kept up to date by triggers, which also remember the earliest
+        changed day in daily_totals_stale. Running totals from that day on are recomputed
+        by _refresh_daily_totals in the same transaction.
+        """
+
+        cursor.execute(
+            """
+            CREATE TABLE daily_totals (
+                day TEXT PRIMARY KEY,
+                net REAL NOT NULL,
+                count INTEGER NOT NULL,
+                cumulative REAL
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE daily_totals_stale (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                day TEXT
+            )
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO daily_totals_stale VALUES (0, NULL)
+            """
+        )
+
+        for table, sign in [("expenses", "-"), ("incomes", "")]:
+            # statements adding NEW row to the day totals and removing OLD row from them
+            add_new = f"""
+                INSERT INTO daily_totals (day, net, count)
+                VALUES (date(NEW.time), {sign}NEW.amount, 1)
+                ON CONFLICT (day) DO UPDATE
+                SET net = net + excluded.net, count = count + 1;
+
+                UPDATE daily_totals_stale SET day = min(coalesce(day, date(NEW.time)), date(NEW.time));
+            """
+            remove_old = f"""
+                UPDATE daily_totals
+                SET net = net - ({sign}OLD.amount), count = count - 1
+                WHERE day = date(OLD.time);
+
+                DELETE FROM daily_totals
+                WHERE day = date(OLD.time) AND count = 0;
+
+                UPDATE daily_totals_stale SET day = min(coalesce(day, date(OLD.time)), date(OLD.time));
+            """
+            cursor.execute(
+                f"""
+                CREATE TRIGGER {table}_daily_insert AFTER INSERT ON {table}
+                BEGIN {add_new} END
+                """
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER {table}_daily_delete AFTER DELETE ON {table}
+                BEGIN {remove_old} END
+                """
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER {table}_daily_update AFTER UPDATE OF amount, time ON {table}
+                BEGIN {remove_old} {add_new} END
+                """
+            )
+
+        cursor.execute(
+            """
+            INSERT INTO daily_totals (day, net, count)
+            SELECT date(time), SUM(net), COUNT(*)
+            FROM (
+                SELECT time, -amount AS net FROM expenses
+                UNION ALL
+                SELECT time, amount AS net FROM incomes
+            )
+            GROUP BY 1
+            """
+        )
+        cursor.execute(
+            """
+            UPDATE daily_totals_stale SET day = (SELECT MIN(day) FROM daily_totals)
+            """
+        )
+        self._refresh_daily_totals(cursor)
+
+    def _refresh_daily_totals(self, cursor: sqlite3.Cursor) -> None:
+        """Recompute running totals of daily_totals from the earliest changed day on."""
+
+        cursor.execute(
+            """
+            SELECT day FROM daily_totals_stale
+            """
+        )
+        stale = cursor.fetchone()[0]
+        if stale is None:
+            return
+
+        # usually only today is changed, so it is a single row
+        cursor.execute(
+            """
+            UPDATE daily_totals SET cumulative = running.cumulative
+            FROM (
+                SELECT
+                    day,
+                    SUM(net) OVER (ORDER BY day) + coalesce(
+                        (SELECT cumulative FROM daily_totals WHERE day < :stale ORDER BY day DESC LIMIT 1),
+                        0
+                    ) AS cumulative
+                FROM daily_totals
+                WHERE day >= :stale
+            ) AS running
+            WHERE daily_totals.day = running.day
+            """,
+            {"stale": stale}
+        )
+        cursor.execute(
+            """
+            UPDATE daily_totals_stale SET day = NULL
+            """
+        )
+
+    @write_operation
+    def rebuild_monthly_category_totals(self) -> None:
+        """Recompute the whole monthly rollup from expenses."""
+
+        with self.connection() as cursor:
+            self._fill_monthly_category_totals(cursor)
+
+    def _add_import_hashes(self, cursor: sqlite3.Cursor) -> None:
+        """Store hashes of imported transactions with a unique index, so imports are idempotent."""
+
+        for table in ["expenses", "incomes"]:
+            cursor.execute(
+                f"""
+                ALTER TABLE {table} ADD COLUMN import_hash TEXT
+                """
+            )
+            cursor.execute(
+                f"""
+                CREATE UNIQUE INDEX {table}_import_hash_idx
+                ON {table} (import_hash)
+                WHERE import_hash IS NOT NULL
+                """
+            )
+
+    def _index_income_time(self, cursor: sqlite3.Cursor) -> None:
+        """Index incomes by time (covering the amount)."""
+
+        cursor.execute(
+            """
+            CREATE INDEX incomes_time_idx
+            ON incomes (time, amount)
+            """
+        )
+
+    def _change_balance(self, cursor: sqlite3.Cursor, delta: float) -> None:
+        """Add delta to balance within the current transaction."""
+
+        cursor.execute(
+            """
+            UPDATE balance SET amount = amount + ?
+            """,
+            (delta,)
+        )
+        self._on_commit(self._invalidate_balance)
+
+    def _invalidate_balance(self) -> None:
+        """Drop cached balance, so it is reloaded on the next read."""
+
+        with self._balance_lock:
+            self._balance = None
+
+    def get_balance(self) -> float:
+        with self._balance_lock:
+            if self._balance is None:
+                with self.connection() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT amount FROM balance
+                        """
+                    )
+                    self._balance = cursor.fetchone()[0]
+            return self._balance
+
+    @write_operation
+    def set_balance(self, new: float) -> None:
+        with self.connection() as cursor:
+            cursor.execute(
+                """
+                UPDATE balance SET amount = ?
+                """,
+                (new,)
+            )
+            self._on_commit(self._invalidate_balance)
+
+    @write_operation
     def add_income(self, income: Income) -> None:
         with self.connection() as cursor:
             cursor.execute(
@@ -82,9 +669,12 @@ class Database:
                 INSERT INTO incomes (amount, description, time)
                 VALUES (:amount, :description, :time)
                 """,
-                asdict(income)
+                asdict(income) | {"time": str_from_time(income.time)}
             )
+            self._change_balance(cursor, income.amount)
+            self._refresh_daily_totals(cursor)
     
+    @write_operation
     def add_expense(self, expense: Expense) -> None:
         with self.connection() as cursor:
             cursor.execute(
@@ -92,53 +682,197 @@ class Database:
                 INSERT INTO expenses (amount, description, time, category_name)
                 VALUES (:amount, :description, :time, :category)
                 """,
-                asdict(expense)
+                asdict(expense) | {"time": str_from_time(expense.time)}
             )
+            self._change_balance(cursor, -expense.amount)
+            self._refresh_daily_totals(cursor)
     
-    def delete_last_expense(self) -> Expense:
+    @staticmethod
+    def _import_hash(transaction: Expense | Income, occurrence: int = 1) -> str:
+        """
+        Hash of all fields of a transaction and of its number among equal transactions
+        of the imported file (counted from 1), identifying it between imports.
+        """
+
+        if isinstance(transaction, Expense):
+            fields = ("expense", transaction.amount, transaction.category, transaction.description, transaction.time)
+        else:
+            fields = ("income", transaction.amount, transaction.description, transaction.time)
+        # the first one is hashed without the number, as by older versions
+        if occurrence > 1:
+            fields += (occurrence,)
+        return hashlib.sha1(repr(fields).encode("utf8")).hexdigest()
+
+    def _hashed_for_import(self, transactions: Iterable[Expense | Income]) -> Iterator[tuple[str, Expense | Income]]:
+        """
+        Pair transactions with their import hashes. Equal transactions of one file
+        (e.g. two equal purchases on the same date) get different hashes if no transaction
+        of another time is between them, as in statements sorted by time (either way).
+        Expenses of unknown categories go to "other" (before hashing,
+        so exported and imported again rows are recognized).
+        """
+
+        # occurrences of equal transactions of the current time, by hash of the first one
+        # (only one time is counted, so memory doesn't grow with the file)
+        occurrences: Counter[str] = Counter()
+        current_time = None
+        for transaction in transactions:
+            if isinstance(transaction, Expense) and not self.has_category(transaction.category):
+                transaction = replace(transaction, category="other")
+            if transaction.time != current_time:
+                occurrences.clear()
+                current_time = transaction.time
+            first_hash = self._import_hash(transaction)
+            occurrences[first_hash] += 1
+            yield self._import_hash(transaction, occurrences[first_hash]), transaction
+
+    def import_transactions(self, transactions: Iterable[Expense | Income], chunk_size: int = 1000) -> tuple[int, int]:
+        """
+        Insert a stream of expenses and incomes in chunks, one transaction per chunk
+        with a single balance update. Transactions already imported earlier (equal in all fields
+        and in the number among equal ones) are skipped. Expenses of unknown categories go to "other".
+        Returns numbers of imported and skipped transactions.
+        """
+
+        imported = 0
+        skipped = 0
+        hashed = self._hashed_for_import(transactions)
+        while chunk := list(islice(hashed, chunk_size)):
+            chunk_imported = self._import_chunk(chunk)
+            imported += chunk_imported
+            skipped += len(chunk) - chunk_imported
+
+        return imported, skipped
+
+    @write_operation
+    def _import_chunk(self, chunk: list[tuple[str, Expense | Income]]) -> int:
+        """
+        Insert new transactions of a chunk of (import hash, transaction) pairs
+        in one transaction. Returns number of inserted ones.
+        """
+
+        by_hash = dict(chunk)
+
         with self.connection() as cursor:
-            # get last expense for the response to user
-            cursor.execute(
+            # drop transactions imported before (looked up through the hash indexes)
+            hashes = list(by_hash)
+            placeholders = ", ".join("?" * len(hashes))
+            for table in ["expenses", "incomes"]:
+                cursor.execute(
+                    f"""
+                    SELECT import_hash FROM {table}
+                    WHERE import_hash IN ({placeholders})
+                    """,
+                    hashes
+                )
+                for (import_hash,) in cursor.fetchall():
+                    del by_hash[import_hash]
+
+            expenses = []
+            incomes = []
+            delta = 0
+            for import_hash, transaction in by_hash.items():
+                time = str_from_time(transaction.time)
+                if isinstance(transaction, Expense):
+                    expenses.append((transaction.amount, transaction.description, time, transaction.category, import_hash))
+                    delta -= transaction.amount
+                else:
+                    incomes.append((transaction.amount, transaction.description, time, import_hash))
+                    delta += transaction.amount
+
+            cursor.executemany(
                 """
-                SELECT * FROM expenses
-                WHERE id = (SELECT MAX(id) FROM expenses)
+                INSERT INTO expenses (amount, description, time, category_name, import_hash)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                expenses
+            )
+            cursor.executemany(
                 """
+                INSERT INTO incomes (amount, description, time, import_hash)
+                VALUES (?, ?, ?, ?)
+                """,
+                incomes
             )
-            
-            # get rid of id
-            result = list(cursor.fetchone())[1:]
+            self._change_balance(cursor, delta)
+            self._refresh_daily_totals(cursor)
 
-            # convert empty description to None
-            if result[2] == "":
-                result[2] = None
+        return len(by_hash)
 
-            # turn string with time into datetime object    
-            result[3] = time_from_str(result[3])
-
-            # construct Expense object
-            expense = Expense(*result)
+    @write_operation
+    def delete_last_expense(self) -> Expense:
+        with self.connection() as cursor:
+            # get last expense for the response to user
+            expense, = self._fetch_expenses(
+                cursor,
+                f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE id = (SELECT MAX(id) FROM expenses)
+                """
+            )
 
-            # delete from database
+            # delete from database and return to previous balance
             cursor.execute(
                 """
                 DELETE FROM expenses
                 WHERE id = (SELECT MAX(id) FROM expenses)
                 """
             )
+            self._change_balance(cursor, expense.amount)
+            self._refresh_daily_totals(cursor)
 
             return expense
     
+    def _cached_categories(self) -> list[str]:
+        """Get cached list of categories, loading it from the database if needed."""
+
+        with self._categories_lock:
+            if self._categories is None:
+                with self.connection() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT * FROM categories
+                        """
+                    )
+                    data = cursor.fetchall()
+                self._categories = [cat[0] for cat in data]
+                self._category_set = frozenset(self._categories)
+                self._category_rows = {}
+            return self._categories
+
+    def _invalidate_categories(self) -> None:
+        """Drop cached categories, so they are reloaded on the next read."""
+
+        with self._categories_lock:
+            self._categories = None
+            self._category_rows = {}
+
     def get_categories(self) -> list[str]:
-        with self.connection() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM categories
-                """
-            )
-            data = cursor.fetchall()
-            categories = [cat[0] for cat in data]
-            return categories
+        # copy, so callers can't modify the cache
+        return list(self._cached_categories())
+
+    def has_category(self, name: str) -> bool:
+        """Whether a category with the given name exists."""
+
+        with self._categories_lock:
+            self._cached_categories()
+            return name in self._category_set
+
+    def category_rows(self, *, row_size: int) -> list[list[str]]:
+        """
+        Category names split in rows for a keyboard.
+        Rows are built once after every change of categories and shared, so they must not be modified.
+        """
+
+        with self._categories_lock:
+            categories = self._cached_categories()
+            rows = self._category_rows.get(row_size)
+            if rows is None:
+                rows = split_in_rows(categories, row_size=row_size)
+                self._category_rows[row_size] = rows
+            return rows
 
+    @write_operation
     def add_category(self, name: str) -> None:
         with self.connection() as cursor:
             cursor.execute(
@@ -147,7 +881,9 @@ class Database:
                 """,
                 (name,)
             )
+            self._on_commit(self._invalidate_categories)
     
+    @write_operation
     def delete_category(self, name: str) -> None:
         with self.connection() as cursor:
             cursor.execute(
@@ -156,7 +892,9 @@ class Database:
                 """,
                 (name,)
             )
+            self._on_commit(self._invalidate_categories)
     
+    @write_operation
     def update_category(self, old: str, new: str) -> None:
         with self.connection() as cursor:
             cursor.execute(
@@ -167,7 +905,9 @@ class Database:
                 """,
                 (new, old)
             )
+            self._on_commit(self._invalidate_categories)
     
+    @write_operation
     def add_balance_to_history(self, time: datetime, amount: float) -> None:
         with self.connection() as cursor:
             cursor.execute(
@@ -175,66 +915,285 @@ class Database:
                 INSERT INTO balance_history (time, amount)
                 VALUES (?, ?)
                 """,
-                (time, amount)
+                (str_from_time(time), amount)
             )
 
-    def get_balance_from_history(self, date: datetime) -> float:
-        """Retrieve balance at the end of a given month."""
+    def _net_before(self, cursor: sqlite3.Cursor, time: datetime) -> float:
+        """
+        Net change of balance by all transactions before a given time: running total
+        of the previous day plus transactions of the day before the time (ranges of time indexes).
+        """
+
+        day = datetime(time.year, time.month, time.day)
+        cursor.execute(
+            """
+            SELECT cumulative FROM daily_totals
+            WHERE day < ?
+            ORDER BY day DESC
+            LIMIT 1
+            """,
+            (f"{day:%Y-%m-%d}",)
+        )
+        result = cursor.fetchone()
+        net = result[0] if result is not None else 0
+
+        if time > day:
+            for table, sign in [("incomes", 1), ("expenses", -1)]:
+                cursor.execute(
+                    f"""
+                    SELECT coalesce(SUM(amount), 0) FROM {table}
+                    WHERE time >= ? AND time < ?
+                    """,
+                    (str_from_time(day), str_from_time(time))
+                )
+                net += sign * cursor.fetchone()[0]
+        return net
+
+    def _net_total(self, cursor: sqlite3.Cursor) -> float:
+        """Net change of balance by all transactions (the last running total)."""
+
+        cursor.execute(
+            """
+            SELECT cumulative FROM daily_totals
+            ORDER BY day DESC
+            LIMIT 1
+            """
+        )
+        result = cursor.fetchone()
+        return result[0] if result is not None else 0
+
+    def balance_at(self, time: datetime) -> float:
+        """
+        Get balance right before a given time: balance of the closest snapshot before it
+        plus net change of transactions in between. If there is no snapshot after the time,
+        the current balance is used instead (it also has manual corrections made since
+        the last snapshot), if there is none before it, the first one after it.
+        """
 
         with self.connection() as cursor:
+            # seeks on balance_history_time_idx
             cursor.execute(
                 """
-                SELECT * FROM balance_history
-                WHERE strftime('%s', balance_history.time) > strftime('%s', ?)
+                SELECT time, amount FROM balance_history
+                WHERE time <= ?
+                ORDER BY time DESC
                 LIMIT 1
                 """,
-                (date,)
+                (str_from_time(time),)
             )
-            result = cursor.fetchone()
-            balance = result[2]
+            before = cursor.fetchone()
+            cursor.execute(
+                """
+                SELECT time, amount FROM balance_history
+                WHERE time > ?
+                ORDER BY time
+                LIMIT 1
+                """,
+                (str_from_time(time),)
+            )
+            after = cursor.fetchone()
 
-            return balance
+            if after is None:
+                # current balance has all transactions
+                return self.get_balance() - self._net_total(cursor) + self._net_before(cursor, time)
+
+            # a snapshot has transactions up to its time inclusively (times are in whole seconds)
+            snapshot_time, amount = before if before is not None else after
+            snapshot_end = time_from_str(snapshot_time) + timedelta(seconds=1)
+            return amount + self._net_before(cursor, time) - self._net_before(cursor, snapshot_end)
+
+    @write_operation
+    def backfill_balance_history(self, now: datetime | None = None) -> int:
+        """
+        Add snapshots of past months which have transactions but no balance snapshot
+        (e.g. the bot wasn't running at their end). The balance at the end of such a month
+        is derived from the closest later snapshot (or the current balance) and net changes
+        of the months in between. Returns number of added snapshots.
+        """
+
+        now = now or time_now()
+        with self.connection() as cursor:
+            # net change of balance per "YYYY-MM", in one pass over the rollup and the incomes index
+            net = defaultdict(float)
+            cursor.execute(
+                """
+                SELECT year, month, SUM(amount) FROM monthly_category_totals
+                GROUP BY year, month
+                """
+            )
+            for year, month, amount in cursor.fetchall():
+                net[f"{year:04d}-{month:02d}"] -= amount
+            cursor.execute(
+                """
+                SELECT substr(time, 1, 7), SUM(amount) FROM incomes
+                GROUP BY substr(time, 1, 7)
+                """
+            )
+            for month, amount in cursor.fetchall():
+                net[month] += amount
+            if not net:
+                return 0
+            first_month = datetime.strptime(min(net), "%Y-%m")
+
+            # time and amount of the last snapshot of every month that has one
+            cursor.execute(
+                """
+                SELECT substr(time, 1, 7), time, amount FROM balance_history
+                ORDER BY time
+                """
+            )
+            snapshots = {month: (time, amount) for month, time, amount in cursor.fetchall()}
+
+            # walk back from the current month, balance is the one at the end of the month
+            month, _ = month_range(now)
+            balance = self.get_balance()
+            missing = []
+            while month > first_month:
+                balance -= net.get(f"{month:%Y-%m}", 0)
+                # the last second of the month, since the balance has all of its transactions
+                # (balance_at takes a snapshot as including transactions up to its time)
+                month_end = month - timedelta(seconds=1)
+                next_month = month
+                month, _ = month_range(month_end)
+                if f"{month:%Y-%m}" in snapshots:
+                    # a snapshot may be taken before the end of its month (e.g. at 23:59:00),
+                    # so transactions after it are added (it has ones up to its time inclusively)
+                    snapshot_time, amount = snapshots[f"{month:%Y-%m}"]
+                    snapshot_end = time_from_str(snapshot_time) + timedelta(seconds=1)
+                    balance = amount + self._net_before(cursor, next_month) - self._net_before(cursor, snapshot_end)
+                else:
+                    missing.append((str_from_time(month_end), balance))
+
+            cursor.executemany(
+                """
+                INSERT INTO balance_history (time, amount)
+                VALUES (?, ?)
+                """,
+                missing
+            )
+            return len(missing)
     
-    def expenses_in(self, date: datetime) -> list[Expense]:
-        """Get list of all expenses in a given month."""
+    def category_totals_in(self, date: datetime) -> dict[str, float]:
+        """Get total amount spent per category in a given month (only categories with expenses)."""
 
-        # defining time interval bounds for expenses
-        start_date = datetime(date.year, date.month, 1, 0, 0, 0)
-        if start_date.month < 12:
-            end_date = datetime(start_date.year, start_date.month + 1, 1, 0, 0, 0)
-        else:
-            end_date = datetime(start_date.year + 1, 1, 1, 0, 0, 0)
+        # read from the rollup, one row per category
+        with self.connection() as cursor:
+            cursor.execute(
+                """
+                SELECT category_name, amount FROM monthly_category_totals
+                WHERE year = ? AND month = ?
+                """,
+                (date.year, date.month)
+            )
+            return dict(cursor.fetchall())
+
+    def biggest_expenses_in(self, date: datetime, n: int) -> list[Expense]:
+        """Get n biggest expenses in a given month (biggest first)."""
+
+        start_date, end_date = month_range(date)
 
+        with self.connection() as cursor:
+            return self._fetch_expenses(
+                cursor,
+                f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE time >= ? AND time < ?
+                ORDER BY amount DESC
+                LIMIT ?
+                """,
+                (str_from_time(start_date), str_from_time(end_date), n)
+            )
+
+    def expense_batch(self, start: datetime, end: datetime) -> ExpenseBatch:
+        """
+        Get expenses between start (inclusive) and end (exclusive) as an ExpenseBatch
+        (in time order), in one query without creating an object per expense.
+        """
+
+        batch = ExpenseBatch()
+        category_ids: dict[str, int] = {}
+
+        # range of the covering expenses_time_idx, no table lookups
         with self.connection() as cursor:
             cursor.execute(
                 """
-                SELECT * FROM expenses
-                WHERE strftime('%s', expenses.time) BETWEEN strftime('%s', ?) AND strftime('%s', ?)
+                SELECT amount, CAST(strftime('%s', time) AS INTEGER), category_name FROM expenses
+                WHERE time >= ? AND time < ?
+                ORDER BY time
                 """,
-                (start_date, end_date)
-            )       
-            results = cursor.fetchall()
+                (str_from_time(start), str_from_time(end))
+            )
+            for amount, time, category in cursor:
+                category_id = category_ids.get(category)
+                if category_id is None:
+                    category_id = category_ids[category] = len(batch.categories)
+                    batch.categories.append(category)
+                batch.amounts.append(amount)
+                batch.times.append(time)
+                batch.category_ids.append(category_id)
 
-            # parse results into Expense objects
-            results = [list(result)[1:] for result in results]
-            expenses = []
-            for result in results:
-                if result[2] == "":
-                    None
-                result[3] = time_from_str(result[3])
-                expense = Expense(*result)
-                expenses.append(expense)
-            
-            return expenses
+        return batch
+
+    def iter_transactions(self, start: datetime | None = None, end: datetime | None = None) -> Iterator[tuple]:
+        """
+        Stream all expenses, incomes and balance history snapshots with time in [start, end)
+        (unbounded if not given) as (type, amount, category, description, time) tuples.
+        Rows are read lazily from one consistent snapshot of the database.
+        """
+
+        # time bounds, so filtering is a range seek on the time indexes
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append("time >= ?")
+            params.append(str_from_time(start))
+        if end is not None:
+            conditions.append("time < ?")
+            params.append(str_from_time(end))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        queries = [
+            f"SELECT 'expense', amount, category_name, description, time FROM expenses {where} ORDER BY time",
+            f"SELECT 'income', amount, NULL, description, time FROM incomes {where} ORDER BY time",
+            f"SELECT 'balance', amount, NULL, NULL, time FROM balance_history {where} ORDER BY time"
+        ]
+
+        # separate connection, so the open read transaction isn't shared
+        # with other operations of this thread while the stream is consumed
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN")
+            for query in queries:
+                yield from conn.execute(query, params)
+        finally:
+            conn.close()
+
+    def expenses_in(self, date: datetime) -> list[Expense]:
+        """Get list of all expenses in a given month."""
+
+        # time interval bounds for expenses
+        start_date, end_date = month_range(date)
+
+        # times are stored as normalized strings, so comparing them
+        # directly lets SQLite do a range seek on expenses_time_idx
+        with self.connection() as cursor:
+            return self._fetch_expenses(
+                cursor,
+                f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE time >= ? AND time < ?
+                """,
+                (str_from_time(start_date), str_from_time(end_date))
+            )
 
 
 class Model:
-    def __init__(self, folder: str) -> None:
+    def __init__(self, folder: str, *, tracer: SqlTracer | None = None) -> None:
         self.folder = folder
         self._folder_path = Path(folder).resolve(strict=True)
         self._balance_path = self._folder_path / "balance.txt"
         self._db_path = self._folder_path / "database.db"
-        self.db = Database(self._db_path)
+        self.db = Database(self._db_path, tracer=tracer)
     
     def setup(self) -> None:
         """Create and initialize all data files if they don't exist yet."""
@@ -243,11 +1202,6 @@ class Model:
         if not self._folder_path.exists():
             os.mkdir(self._folder_path)
 
-        # create balance file
-        if not self._balance_path.exists():
-            with open(self._balance_path, "w") as f:
-                f.write("0")
-
         # create database
         if not self._db_path.exists():
             self.db.create_schema()
@@ -260,49 +1214,162 @@ class Model:
                     categories: list[str] = json.load(f)
                     for category in categories:
                         self.db.add_category(category)
+
+        # bring existing database files up to date
+        self.db.migrate()
+
+        # move balance from the file used by older versions into the database
+        if self._balance_path.exists():
+            with open(self._balance_path, "r") as f:
+                self.db.set_balance(float(f.read()))
+            self._balance_path.rename(self._balance_path.with_suffix(".txt.imported"))
+
+        # snapshots of months which ended while the bot wasn't running
+        self.db.backfill_balance_history()
     
     def get_balance(self) -> float:
-        with open(self._balance_path, "r") as f:
-            balance = float(f.read())
-            return balance
+        return self.db.get_balance()
     
     def set_balance(self, new: float) -> None:
-        with open(self._balance_path, "w") as f:
-            f.write(str(new))
+        self.db.set_balance(new)
+
+    def import_file(self, path: str | Path) -> tuple[int, int]:
+        """
+        Import expenses and incomes from a .csv or .jsonl file.
+        Returns numbers of imported and skipped (already imported) transactions.
+        """
+
+        return self.db.import_transactions(transactions_from_file(path))
+
+    def export_file(self, path: str | Path, start: datetime | None = None, end: datetime | None = None) -> int:
+        """
+        Export expenses, incomes and balance history with time in [start, end) into
+        a .csv or .jsonl file (gzipped if its name ends with .gz). Returns number of exported rows.
+        """
+
+        return export_to_file(self.db.iter_transactions(start, end), path)
+
+    def close(self) -> None:
+        """Release all database connections."""
+
+        self.db.close()
 
 
 class ReadOnlyDatabase(Database):
     """Allows only data reading, other operations aren't executed."""
 
+    # no journal mode switch, since it writes to the database file
+    PRAGMAS = [
+        "PRAGMA foreign_keys = 1",
+        "PRAGMA query_only = 1",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -8000"
+    ]
+
     def create_schema(self) -> None:
         pass
 
+    def migrate(self) -> None:
+        pass
+
+    def rebuild_monthly_category_totals(self) -> None:
+        pass
+
     def add_income(self, income: Income) -> None:
         pass
 
     def add_expense(self, expense: Expense) -> None:
         pass
 
-    def delete_last_expense(self) -> Expense:
-        # just get and return last expense without deleting it
+    def import_transactions(self, transactions: Iterable[Expense | Income], chunk_size: int = 1000) -> tuple[int, int]:
+        return 0, 0
+
+    def set_balance(self, new: float) -> None:
+        pass
+
+    def add_balance_to_history(self, time: datetime, amount: float) -> None:
+        pass
+
+    def backfill_balance_history(self, now: datetime | None = None) -> int:
+        return 0
+
+    def _has_table(self, cursor: sqlite3.Cursor, name: str) -> bool:
+        """Whether the database file has a given table (files of older versions aren't migrated)."""
+
+        cursor.execute(
+            """
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = ?
+            """,
+            (name,)
+        )
+        return cursor.fetchone() is not None
+
+    def get_balance(self) -> float:
         with self.connection() as cursor:
+            has_balance = self._has_table(cursor, "balance")
+        if has_balance:
+            return super().get_balance()
+
+        # older versions keep balance in a file next to the database
+        with open(Path(self.path).with_name("balance.txt"), "r") as f:
+            return float(f.read())
+
+    def _summed_net(self, cursor: sqlite3.Cursor, time: datetime | None) -> float:
+        """Net change of balance by transactions before a given time (all if None), summed directly."""
+
+        where = "WHERE time < ?" if time is not None else ""
+        params = (str_from_time(time),) if time is not None else ()
+        net = 0
+        for table, sign in [("incomes", 1), ("expenses", -1)]:
             cursor.execute(
-                """
-                SELECT * FROM expenses
-                WHERE id = (SELECT MAX(id) FROM expenses)
-                """
+                f"""
+                SELECT coalesce(SUM(amount), 0) FROM {table}
+                {where}
+                """,
+                params
             )
-            
-            result = list(cursor.fetchone())[1:]
+            net += sign * cursor.fetchone()[0]
+        return net
+
+    def _net_before(self, cursor: sqlite3.Cursor, time: datetime) -> float:
+        if self._has_table(cursor, "daily_totals"):
+            return super()._net_before(cursor, time)
+        return self._summed_net(cursor, time)
+
+    def _net_total(self, cursor: sqlite3.Cursor) -> float:
+        if self._has_table(cursor, "daily_totals"):
+            return super()._net_total(cursor)
+        return self._summed_net(cursor, None)
 
-            if result[2] == "":
-                result[2] = None
-  
-            result[3] = time_from_str(result[3])
+    def category_totals_in(self, date: datetime) -> dict[str, float]:
+        with self.connection() as cursor:
+            if self._has_table(cursor, "monthly_category_totals"):
+                return super().category_totals_in(date)
 
-            expense = Expense(*result)
+            # no rollup yet, so expenses of the month are summed directly
+            start_date, end_date = month_range(date)
+            cursor.execute(
+                """
+                SELECT category_name, SUM(amount) FROM expenses
+                WHERE time >= ? AND time < ?
+                GROUP BY category_name
+                """,
+                (str_from_time(start_date), str_from_time(end_date))
+            )
+            return dict(cursor.fetchall())
 
-            return expense 
+    def delete_last_expense(self) -> Expense:
+        # just get and return last expense without deleting it
+        with self.connection() as cursor:
+            expense, = self._fetch_expenses(
+                cursor,
+                f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE id = (SELECT MAX(id) FROM expenses)
+                """
+            )
+            return expense
     
     def add_category(self, name: str) -> None:
         pass
@@ -315,12 +1382,19 @@ class ReadOnlyDatabase(Database):
 
 
 class DummyModel(Model):
-    def __init__(self, folder: str) -> None:
-        super().__init__(folder)
-        self.db = ReadOnlyDatabase(self._db_path)
+    def __init__(self, folder: str, *, tracer: SqlTracer | None = None) -> None:
+        super().__init__(folder, tracer=tracer)
+        self.db = ReadOnlyDatabase(self._db_path, tracer=tracer)
     
     def setup(self) -> None:
         pass
 
+    def get_balance(self) -> float:
+        # data folder of an older version, which isn't migrated in read-only mode
+        if self._balance_path.exists():
+            with open(self._balance_path, "r") as f:
+                return float(f.read())
+        return self.db.get_balance()
+
     def set_balance(self, new: float) -> None:
         pass
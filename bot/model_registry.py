@@ -0,0 +1,141 @@
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from .model import Model
+from .sql_trace import SqlTracer
+
+
+class ModelRegistry:
+    """
+    Gives the Model of a user. In multi-user mode every user has own data folder
+    inside the main one, otherwise all users share the main folder.
+    Models are created (and set up) on first use, at most max_open of them are kept open
+    and the least recently used ones are closed.
+    A model is used under a lease (acquire and release, or lease), so it isn't closed while in use:
+    a model evicted while leased is closed once the last lease is released, and it is
+    given out again (instead of opening the same files twice) if it is needed before that.
+    With single_writer, writes of every model are executed by its own writer thread.
+    With a tracer, statements of all models are logged by it.
+    """
+
+    def __init__(self, folder: str, *, multi_user: bool = False, model_class: type[Model] = Model, max_open: int = 64, single_writer: bool = False, tracer: SqlTracer | None = None) -> None:
+        self.folder = Path(folder)
+        self.multi_user = multi_user
+        self.model_class = model_class
+        self.max_open = max_open
+        self.single_writer = single_writer
+        self.tracer = tracer
+        # open models by their data folder, most recently used last
+        self._models: OrderedDict[Path, Model] = OrderedDict()
+        # evicted models which are still leased
+        self._retired: dict[Path, Model] = {}
+        # number of leases of every leased model
+        self._leases: Counter[Path] = Counter()
+        # models being opened (outside of the lock), so other threads wait for them
+        self._opening: dict[Path, Future] = {}
+        self._lock = threading.Lock()
+
+    def folder_for(self, user_id: int) -> Path:
+        """Data folder of a given user."""
+
+        if self.multi_user:
+            return self.folder / str(user_id)
+        return self.folder
+
+    def acquire(self, user_id: int) -> Model:
+        """Lease Model of a given user, opening it if needed. Every call needs a release."""
+
+        folder = self.folder_for(user_id)
+        while True:
+            with self._lock:
+                model = self._models.get(folder)
+                if model is None and folder in self._retired:
+                    # evicted, but not closed yet
+                    model = self._models[folder] = self._retired.pop(folder)
+                if model is not None:
+                    self._models.move_to_end(folder)
+                    self._leases[folder] += 1
+                    return model
+
+                opening = self._opening.get(folder)
+                if opening is None:
+                    opening = self._opening[folder] = Future()
+                    break
+            # opened by another thread, then taken from the open ones
+            opening.result()
+
+        # setup (migrations, backfill) doesn't hold up models of other users
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+            model = self.model_class(str(folder), tracer=self.tracer)
+            model.setup()
+            if self.single_writer:
+                model.db.start_writer()
+        except BaseException as e:
+            with self._lock:
+                del self._opening[folder]
+            opening.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._opening[folder]
+            self._models[folder] = model
+            self._leases[folder] += 1
+            evicted = self._evict()
+        opening.set_result(model)
+
+        for model_to_close in evicted:
+            model_to_close.close()
+        return model
+
+    def release(self, user_id: int) -> None:
+        """End a lease of Model of a given user (closing it if it was evicted meanwhile)."""
+
+        folder = self.folder_for(user_id)
+        with self._lock:
+            self._leases[folder] -= 1
+            if self._leases[folder] > 0:
+                return
+            del self._leases[folder]
+            model = self._retired.pop(folder, None)
+        if model is not None:
+            model.close()
+
+    @contextmanager
+    def lease(self, user_id: int) -> Iterator[Model]:
+        """Use Model of a given user within a with block."""
+
+        model = self.acquire(user_id)
+        try:
+            yield model
+        finally:
+            self.release(user_id)
+
+    def _evict(self) -> list[Model]:
+        """
+        Take the least recently used models over the limit out of the open ones (under the lock).
+        Returns the ones to close now, leased ones are closed on their last release.
+        """
+
+        to_close = []
+        while len(self._models) > self.max_open:
+            folder, model = self._models.popitem(last=False)
+            if self._leases[folder] > 0:
+                self._retired[folder] = model
+            else:
+                to_close.append(model)
+        return to_close
+
+    def close(self) -> None:
+        """Close all open models."""
+
+        with self._lock:
+            models = list(self._models.values()) + list(self._retired.values())
+            self._models.clear()
+            self._retired.clear()
+        for model in models:
+            model.close()
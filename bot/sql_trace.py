@@ -0,0 +1,167 @@
+import logging
+import sqlite3
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+
+class SqlTracer:
+    """
+    Logs statements executed on connections of a Database (with tracing enabled):
+    every statement SQLite runs (including ones of triggers) is logged by the trace callback,
+    statements executed through cursors are also logged with duration, returned (or changed) rows
+    and approximate number of virtual machine steps (counted by the progress handler).
+    Statements slower than slow_threshold seconds go to the slow query log with their EXPLAIN QUERY PLAN.
+    Both logs are rotated.
+    """
+
+    # progress handler is called every PROGRESS_STEPS virtual machine instructions
+    PROGRESS_STEPS = 1000
+
+    def __init__(
+        self,
+        trace_path: str | Path | None,
+        slow_path: str | Path | None,
+        slow_threshold: float = 0.1,
+        max_bytes: int = 1024 * 1024,
+        backup_count: int = 3
+    ) -> None:
+        self.slow_threshold = slow_threshold
+
+        self.logger = logging.getLogger("bot.sql")
+        self.slow_logger = logging.getLogger("bot.sql.slow")
+        # slow statements are already logged by the trace
+        self.slow_logger.propagate = False
+        formatter = logging.Formatter("%(asctime)s %(threadName)s %(message)s")
+        for logger, path in [(self.logger, trace_path), (self.slow_logger, slow_path)]:
+            if path is not None:
+                handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf8")
+                handler.setFormatter(formatter)
+                logger.addHandler(handler)
+                logger.setLevel(logging.DEBUG)
+
+    def install(self, conn: "TracingConnection") -> None:
+        """Set the trace callback and the progress handler of a new connection."""
+
+        conn.tracer = self
+
+        def count_steps() -> int:
+            conn.vm_steps += 1
+            # 0 lets the statement continue
+            return 0
+
+        conn.set_progress_handler(count_steps, self.PROGRESS_STEPS)
+        conn.set_trace_callback(self._trace)
+
+    def _trace(self, sql: str) -> None:
+        self.logger.debug("sql: %s", " ".join(sql.split()))
+
+    def record(self, conn: "TracingConnection", sql: str, parameters, duration: float, rows: int, steps: int) -> None:
+        """Log a statement executed through a cursor, with its plan if it was slow."""
+
+        message = f"{duration * 1000:.2f} ms, {rows} rows, ~{steps * self.PROGRESS_STEPS} steps: {' '.join(sql.split())}"
+        if parameters is not None:
+            message += f" {parameters!r:.200}"
+        self.logger.debug(message)
+
+        if duration >= self.slow_threshold:
+            plan = self._query_plan(conn, sql, parameters)
+            self.slow_logger.warning("%s\n%s", message, plan)
+
+    def _query_plan(self, conn: sqlite3.Connection, sql: str, parameters) -> str:
+        """EXPLAIN QUERY PLAN of a statement as indented lines (or why there is none)."""
+
+        if parameters is None:
+            parameters = ()
+        try:
+            # Connection.execute uses a plain cursor, so the plan isn't recorded itself
+            rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        except sqlite3.Error as e:
+            return f"    (no query plan: {e})"
+
+        # rows are (id, parent id, unused, detail), children are indented under parents
+        depth = {0: 0}
+        lines = []
+        for node_id, parent_id, _, detail in rows:
+            depth[node_id] = depth.get(parent_id, 0) + 1
+            lines.append("    " * depth[node_id] + detail)
+        return "\n".join(lines)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    Cursor measuring time spent executing a statement and fetching its rows.
+    The statement is recorded by the tracer of the connection when the next one
+    is executed or the cursor is closed.
+    """
+
+    def __init__(self, connection: "TracingConnection") -> None:
+        super().__init__(connection)
+        self._sql: str | None = None
+
+    def _begin(self, sql: str, parameters) -> None:
+        self._finish()
+        self._sql = sql
+        self._parameters = parameters
+        self._duration = 0.0
+        self._rows = 0
+        self._steps_start = self.connection.vm_steps
+
+    def _finish(self) -> None:
+        if self._sql is None:
+            return
+        # changed rows for statements which don't return rows
+        rows = self._rows if self.description is not None else max(self.rowcount, 0)
+        steps = self.connection.vm_steps - self._steps_start
+        self.connection.tracer.record(self.connection, self._sql, self._parameters, self._duration, rows, steps)
+        self._sql = None
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._duration += time.perf_counter() - start
+
+    def execute(self, sql: str, parameters=()):
+        self._begin(sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters):
+        # parameters of every row would flood the log
+        self._begin(sql, None)
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        self._rows += row is not None
+        return row
+
+    def fetchmany(self, size: int | None = None):
+        rows = self._timed(super().fetchmany, size if size is not None else self.arraysize)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        self._rows += 1
+        return row
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+
+class TracingConnection(sqlite3.Connection):
+    """Connection creating TracingCursors, set up by SqlTracer.install."""
+
+    tracer: SqlTracer
+    vm_steps = 0
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
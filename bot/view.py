@@ -1,15 +1,17 @@
-import io
+import asyncio
+from datetime import datetime
+from pathlib import Path
 
-import matplotlib.pyplot as plt
-from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.update import Update
+from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 
-from .core.interfaces import Expense, Income, MonthStatistics
+from .core.interfaces import Expense, Income, MonthStatistics, RangeStatistics
 from .core.utils import str_from_time
+from .core.metrics import Metrics, phase
+from .charts import ChartRenderer
 
 
 class View:
-    def __init__(self) -> None:
+    def __init__(self, chart_workers: int = 0) -> None:
         self.month_names = {
             1: "January",
             2: "February",
@@ -24,25 +26,35 @@ class View:
             11: "November",
             12: "December"
         }
+        # charts are rendered in chart_workers processes (in a thread of the bot process if 0)
+        self.charts = ChartRenderer(workers=chart_workers)
 
-    def reply(self, update: Update, text: str) -> None:
+    def close(self) -> None:
+        """Stop chart rendering processes."""
+
+        self.charts.shutdown()
+
+    async def reply(self, update: Update, text: str) -> None:
         """Send the given text to the user."""
 
-        update.message.reply_text(text)
+        with phase("send"):
+            await update.message.reply_text(text)
     
-    def reply_with_replykeyboard(self, update: Update, *, text: str, buttons: list[list[str]], placeholder: str = "") -> None:
+    async def reply_with_replykeyboard(self, update: Update, *, text: str, buttons: list[list[str]], placeholder: str = "") -> None:
         """Show a ReplyKeyboard with the given button labels to the user."""
 
         keyboard = ReplyKeyboardMarkup(
             buttons,
             input_field_placeholder=placeholder
         )
-        update.message.reply_text(text, reply_markup=keyboard)
+        with phase("send"):
+            await update.message.reply_text(text, reply_markup=keyboard)
     
-    def reply_and_remove_replykeyboard(self, update: Update, text: str) -> None:
-        update.message.reply_text(text, reply_markup=ReplyKeyboardRemove())
+    async def reply_and_remove_replykeyboard(self, update: Update, text: str) -> None:
+        with phase("send"):
+            await update.message.reply_text(text, reply_markup=ReplyKeyboardRemove())
     
-    def expense(self, update: Update, expense: Expense) -> None:
+    async def expense(self, update: Update, expense: Expense) -> None:
         """Show successful addition of an Expense."""
 
         description = expense.description if expense.description is not None else ""
@@ -51,18 +63,18 @@ class View:
                              f"Category: {expense.category.capitalize()}",
                              f"Description: {description}",
                              f"Time: {str_from_time(expense.time)}"])
-        self.reply(update, response)
+        await self.reply(update, response)
     
-    def income(self, update: Update, income: Income) -> None:
+    async def income(self, update: Update, income: Income) -> None:
         """Show successful addition of an Income."""
 
         response = "\n".join(["Added new income:",
                              f"Amount: {income.amount:.2f}",
                              f"Description: {income.description}",
                              f"Time: {str_from_time(income.time)}"])
-        self.reply(update, response)
+        await self.reply(update, response)
     
-    def cancel(self, update: Update, expense: Expense) -> None:
+    async def cancel(self, update: Update, expense: Expense) -> None:
         """Show successful deletion of the last Expense."""
 
         description = expense.description if expense.description is not None else ""
@@ -71,23 +83,44 @@ class View:
                              f"Category: {expense.category.capitalize()}",
                              f"Description: {description}",
                              f"Time: {str_from_time(expense.time)}"])
-        self.reply(update, response)
+        await self.reply(update, response)
     
-    def balance(self, update: Update, balance: float) -> None:
+    async def balance(self, update: Update, balance: float) -> None:
         """Show current balance."""
 
         response = f"Current balance is: {balance:.2f}"
-        self.reply(update, response)
+        await self.reply(update, response)
+    
+    async def balance_at(self, update: Update, day: datetime, balance: float) -> None:
+        """Show balance at the end of a given day."""
+
+        response = f"Balance at the end of {day:%Y-%m-%d} was: {balance:.2f}"
+        await self.reply(update, response)
     
-    def categories(self, update: Update, categories: list[str]) -> None:
+    async def categories(self, update: Update, categories: list[str]) -> None:
         """Show the current list of categories."""
 
         response = f"Categories:\n"
         for idx, category in enumerate(categories, start=1):
             response += f"{idx}. {category.capitalize()}\n"
-        self.reply(update, response)
+        await self.reply(update, response)
     
-    def month_statistics(self, update: Update, month_stat: MonthStatistics) -> None:
+    async def document(self, update: Update, path: Path) -> None:
+        """Send a file to the user."""
+
+        with open(path, "rb") as f:
+            with phase("send"):
+                await update.message.reply_document(document=f, filename=path.name)
+
+    async def imported(self, update: Update, imported: int, skipped: int) -> None:
+        """Show result of importing transactions from a file."""
+
+        response = f"Imported {imported} transactions."
+        if skipped:
+            response += f"\nSkipped {skipped} already imported ones."
+        await self.reply(update, response)
+
+    async def month_statistics(self, update: Update, month_stat: MonthStatistics) -> None:
         """Show the given month statistics."""
 
         # creating response text
@@ -98,18 +131,25 @@ class View:
         
         response += "Biggest expenses:\n"
         for idx, expense in enumerate(month_stat.biggest_expenses, start=1):
+            description = expense.description if expense.description is not None else ""
             response += f"{idx}) {expense.category.capitalize()} {expense.amount:.2f}\n"
-            response += f"Description: {expense.description}\n"
+            response += f"Description: {description}\n"
             response += f"Time: {str_from_time(expense.time)}\n"
         
-        response += f"\nStart balance: {month_stat.start_balance:.2f}\n"
-        response += f"Last balance: {month_stat.end_balance}\n"
+        # balances are None if there is no snapshot of them in history
+        start_balance_str = f"{month_stat.start_balance:.2f}" if month_stat.start_balance is not None else "unknown"
+        end_balance_str = f"{month_stat.end_balance:.2f}" if month_stat.end_balance is not None else "unknown"
+        response += f"\nStart balance: {start_balance_str}\n"
+        response += f"Last balance: {end_balance_str}\n"
 
         diff = month_stat.balance_difference
-        diff_signed_str = f"+{diff:.2f}" if diff > 0 else f"-{abs(diff):.2f}"
-        percentage = (month_stat.end_balance / month_stat.start_balance - 1) * 100
-        percentage_signed_str = f"+{percentage:.2f}" if percentage > 0 else f"-{abs(percentage):.2f}"
-        response += f"Difference: {diff_signed_str} ({percentage_signed_str}%)"
+        if diff is not None:
+            diff_signed_str = f"+{diff:.2f}" if diff > 0 else f"-{abs(diff):.2f}"
+            response += f"Difference: {diff_signed_str}"
+            if month_stat.start_balance != 0:
+                percentage = (month_stat.end_balance / month_stat.start_balance - 1) * 100
+                percentage_signed_str = f"+{percentage:.2f}" if percentage > 0 else f"-{abs(percentage):.2f}"
+                response += f" ({percentage_signed_str}%)"
 
         # creating statistics bar chart
         # preparing data
@@ -117,22 +157,61 @@ class View:
         categories = [cat.capitalize() for cat in sorted_statistics.keys()]
         amounts = list(sorted_statistics.values())
 
-        # creating barchart
-        plt.figure(figsize=(10, 6), dpi=100)
-        plt.grid(True, linestyle=":", color="gray", linewidth=0.5)
-        barchart = plt.barh(categories, amounts, height=0.7)
-        plt.title(header)
-        plt.xlabel("Amount of money spent")
-
-        # adding amounts into respective bars
-        for bar, amount in zip(barchart, amounts):
-            plt.text(bar.get_width() - 10, bar.get_y() + bar.get_height() / 2, f"{amount:.0f}", color="white", ha="right", va="center", size=18)
-
-        plt.tight_layout()
-
-        # save figure to an io buffer
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format="png")
-        img_buffer.seek(0)
-
-        update.message.reply_photo(caption=response, photo=img_buffer)
\ No newline at end of file
+        # rendering barchart off the event loop (or taking it from the cache)
+        try:
+            with phase("render"):
+                chart = await asyncio.wrap_future(self.charts.bar_chart_async(header, categories, amounts))
+        except Exception:
+            await self.reply(update, response)
+        else:
+            with phase("send"):
+                await update.message.reply_photo(caption=response, photo=chart)
+
+    async def range_statistics(self, update: Update, title: str, range_stat: RangeStatistics) -> None:
+        """Show the given statistics of a range of months."""
+
+        category_totals = range_stat.category_totals
+        total = sum(category_totals.values())
+
+        response = f"{title}\n\n"
+        response += "Spent by category:\n"
+        for category, amount in category_totals.items():
+            response += f"{category.capitalize()}: {amount:.2f}\n"
+        response += f"\nTotal spent: {total:.2f}\n"
+        response += f"Average per month: {range_stat.average_per_month:.2f}\n"
+
+        response += f"\nStart balance: {range_stat.start_balance:.2f}\n"
+        response += f"Last balance: {range_stat.end_balance:.2f}\n"
+
+        diff = range_stat.balance_difference
+        diff_signed_str = f"+{diff:.2f}" if diff > 0 else f"-{abs(diff):.2f}"
+        response += f"Difference: {diff_signed_str}"
+
+        # one stacked bar per month, rendered off the event loop (or taken from the cache)
+        categories = [category.capitalize() for category in range_stat.categories]
+        try:
+            with phase("render"):
+                chart = await asyncio.wrap_future(self.charts.stacked_chart_async(title, range_stat.months, categories, range_stat.amounts))
+        except Exception:
+            await self.reply(update, response)
+        else:
+            with phase("send"):
+                await update.message.reply_photo(caption=response, photo=chart)
+
+    async def metrics(self, update: Update, metrics: Metrics) -> None:
+        """Show call counts and latencies of handlers (mean and bucket of the 95th percentile)."""
+
+        if not metrics.handlers:
+            await self.reply(update, "No handlers were called yet.")
+            return
+
+        response = "Handler: calls (errors)\n"
+        response += "total / db / render / send: mean ms (p95 \u2264 ms)\n"
+        for name, stats in sorted(metrics.handlers.items()):
+            response += f"\n{name}: {stats.calls} ({stats.errors})\n"
+            parts = []
+            for phase_name, histogram in stats.histograms.items():
+                if histogram.count:
+                    parts.append(f"{phase_name} {histogram.mean * 1000:.0f} ({histogram.quantile(0.95) * 1000:.0f})")
+            response += ", ".join(parts) + "\n"
+        await self.reply(update, response)
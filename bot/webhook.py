@@ -0,0 +1,118 @@
+import asyncio
+import hmac
+import json
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+
+class WebhookServer:
+    """
+    Minimal HTTP server receiving updates which Telegram POSTs to the webhook url
+    and putting them straight into the update queue of an Application.
+    Only the path of the url is served, requests without the secret token (if set) are rejected.
+    By default only local connections are accepted (e.g. from a reverse proxy).
+    Connections are kept alive, since Telegram reuses them for following updates.
+    """
+
+    # limit of a request body, updates are much smaller
+    MAX_BODY_SIZE = 1024 * 1024
+
+    def __init__(self, application: Application, url: str, *, listen: str = "127.0.0.1", port: int = 8443, secret_token: str | None = None) -> None:
+        self.application = application
+        self.url = url
+        self.path = urlsplit(url).path or "/"
+        self.listen = listen
+        self.port = port
+        self.secret_token = secret_token
+        self._server: asyncio.Server | None = None
+        # open connections, closed on stop
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        """Start accepting connections (port 0 picks a free port, which is then saved to self.port)."""
+
+        self._server = await asyncio.start_server(self._serve, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop accepting connections and close open ones."""
+
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle requests of one connection until the client closes it."""
+
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                # headers up to an empty line, names lowercased
+                headers = {}
+                while (line := await reader.readline()) not in [b"\r\n", b"\n", b""]:
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", "0"))
+                except ValueError:
+                    length = -1
+                if not (0 <= length <= self.MAX_BODY_SIZE):
+                    await self._respond(writer, 400, "Bad Request", keep_alive=False)
+                    break
+                body = await reader.readexactly(length)
+
+                status, reason = await self._handle(request_line, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, reason, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle(self, request_line: bytes, headers: dict[str, str], body: bytes) -> tuple[int, str]:
+        """Put an update of a request into the update queue. Returns status code and reason of the response."""
+
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return 400, "Bad Request"
+
+        if urlsplit(target).path != self.path:
+            return 404, "Not Found"
+        if method != "POST":
+            return 405, "Method Not Allowed"
+        if self.secret_token is not None:
+            # compared as bytes, since compare_digest rejects non-ASCII strings
+            token = headers.get("x-telegram-bot-api-secret-token", "").encode("latin-1")
+            if not hmac.compare_digest(token, self.secret_token.encode("utf8")):
+                return 403, "Forbidden"
+
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                return 400, "Bad Request"
+            update = Update.de_json(data, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return 400, "Bad Request"
+
+        await self.application.update_queue.put(update)
+        return 200, "OK"
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, reason: str, *, keep_alive: bool) -> None:
+        connection = "keep-alive" if keep_alive else "close"
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\nConnection: {connection}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
@@ -1,42 +1,148 @@
+import time
+
+# taken before other imports, so they are included into the startup profile
+STARTUP_TIME = time.perf_counter()
+
 import sys
 import os
-import threading
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
 import dotenv
-from telegram.ext import Updater, Filters
+from telegram.ext import Application, filters
 
 from bot.balance_tracker import track_balance
 from bot.controllers import MasterController
 from bot.view import View
 from bot.model import Model, DummyModel
+from bot.model_registry import ModelRegistry
+from bot.sql_trace import SqlTracer
+from bot.webhook import WebhookServer
+from bot.core.startup_profile import StartupProfile
+from bot.core.metrics import schedule_metrics_file
+from bot.core.utils import date_from_str
+
+IMPORTS_TIME = time.perf_counter()
 
 
 def main():
     dotenv.load_dotenv(".env")
     TELEGRAM_API_KEY = os.getenv("TELEGRAM_API_KEY")
-    TELEGRAM_USER_ID = int(os.getenv("TELEGRAM_USER_ID"))
+    # comma-separated ids of allowed users (a single TELEGRAM_USER_ID also works)
+    TELEGRAM_USER_IDS = {
+        int(user_id)
+        for user_id in os.getenv("TELEGRAM_USER_IDS", os.getenv("TELEGRAM_USER_ID", "")).split(",")
+        if user_id.strip()
+    }
     DATA_DIR_PATH = "data"
+    # whether every user gets own data folder inside DATA_DIR_PATH
+    MULTI_USER = os.getenv("MULTI_USER", "0") == "1"
+    # how many users' models are kept open at once
+    MAX_OPEN_MODELS = int(os.getenv("MAX_OPEN_MODELS", "64"))
+    # number of processes rendering charts (0 renders them in a thread of the bot process)
+    CHART_WORKERS = int(os.getenv("CHART_WORKERS", "1"))
+    # number of threads executing database calls of handlers (handlers themselves are coroutines)
+    BOT_WORKERS = int(os.getenv("BOT_WORKERS", "4"))
+    # public https url Telegram posts updates to in --webhook mode (its path is served),
+    # local address and port of the server behind it and a secret token Telegram sends
+    # with every update (required, since anyone reaching the port could post updates otherwise)
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    # comma-separated ids of users allowed to use /metrics and /block
+    # (by default all allowed users in single-user mode and no one in multi-user mode)
+    ADMIN_USER_IDS = {
+        int(user_id)
+        for user_id in os.getenv("ADMIN_USER_IDS", "").split(",")
+        if user_id.strip()
+    } or (TELEGRAM_USER_IDS if not MULTI_USER else set())
+    # seconds between writes of handler metrics into DATA_DIR_PATH/metrics.prom
+    METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "60"))
+    # whether every SQL statement is logged into DATA_DIR_PATH/sql_trace.log
+    # and ones slower than SLOW_QUERY_MS (with their query plans) into DATA_DIR_PATH/slow_queries.log
+    SQL_TRACE = os.getenv("SQL_TRACE", "0") == "1"
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+    async def use_db_executor(application: Application) -> None:
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BOT_WORKERS, thread_name_prefix="db"))
 
-    updater = Updater(TELEGRAM_API_KEY)
-    user_filter = Filters.user(TELEGRAM_USER_ID)
-    view = View()
+    application = Application.builder().token(TELEGRAM_API_KEY).post_init(use_db_executor).build()
+    # allowed users are looked up in a set
+    user_filter = filters.User(user_id=TELEGRAM_USER_IDS)
+    admin_filter = filters.User(user_id=ADMIN_USER_IDS)
+    view = View(chart_workers=CHART_WORKERS)
+    model_class = Model
+    profile = None
+    webhook = None
 
-    if len(sys.argv) == 1:
-        model = Model(DATA_DIR_PATH)
-    else:
+    if len(sys.argv) > 1:
         match sys.argv[1:]:
             case ["-ro" | "--read-only"]:
-                model = DummyModel(DATA_DIR_PATH)
+                model_class = DummyModel
+            case ["--webhook"]:
+                if WEBHOOK_URL is None:
+                    print("WEBHOOK_URL is not set.")
+                    return
+                if not WEBHOOK_SECRET:
+                    print("WEBHOOK_SECRET is not set.")
+                    return
+                webhook = WebhookServer(application, WEBHOOK_URL, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, secret_token=WEBHOOK_SECRET)
+            case ["--startup-profile"]:
+                profile = StartupProfile(STARTUP_TIME)
+                profile.mark("imports", at=IMPORTS_TIME)
+            case ["--rebuild-rollup"]:
+                model = Model(DATA_DIR_PATH)
+                model.setup()
+                model.db.rebuild_monthly_category_totals()
+                model.close()
+                print("Monthly totals rebuilt.")
+                return
+            case ["--import", path]:
+                model = Model(DATA_DIR_PATH)
+                model.setup()
+                imported, skipped = model.import_file(path)
+                model.close()
+                print(f"Imported {imported} transactions, skipped {skipped} already imported.")
+                return
+            case ["--export", path, *dates] if len(dates) <= 2:
+                # optional start and end (inclusive) dates as YYYY-MM-DD
+                start = date_from_str(dates[0]) if len(dates) > 0 else None
+                end = date_from_str(dates[1]) + timedelta(days=1) if len(dates) > 1 else None
+                model = Model(DATA_DIR_PATH)
+                model.setup()
+                exported = model.export_file(path, start, end)
+                model.close()
+                print(f"Exported {exported} rows.")
+                return
             case _:
                 print("Invalid command line arguments.")
                 return
 
-    balance_tracker_thread = threading.Thread(target=track_balance, args=(model,))
-    balance_tracker_thread.start()
+    tracer = None
+    if SQL_TRACE:
+        tracer = SqlTracer(
+            os.path.join(DATA_DIR_PATH, "sql_trace.log"),
+            os.path.join(DATA_DIR_PATH, "slow_queries.log"),
+            slow_threshold=SLOW_QUERY_MS / 1000
+        )
+
+    # handlers run concurrently, so writes of each model go through its single writer thread
+    models = ModelRegistry(DATA_DIR_PATH, multi_user=MULTI_USER, model_class=model_class, max_open=MAX_OPEN_MODELS, single_writer=True, tracer=tracer)
+
+    # month end balance snapshots, run by the job queue of the application
+    track_balance(application.job_queue, models, TELEGRAM_USER_IDS)
+    # handler latencies in the Prometheus text format
+    schedule_metrics_file(application.job_queue, os.path.join(DATA_DIR_PATH, "metrics.prom"), METRICS_INTERVAL)
+
+    controller = MasterController(application, user_filter, view, models, admin_filter=admin_filter)
 
-    controller = MasterController(updater, user_filter, view, model)
-    
-    controller.start_bot(poll_interval=1, timeout=5)
+    # in multi-user mode models are opened on the first update of each user
+    preloaded_user_ids = TELEGRAM_USER_IDS if not MULTI_USER else ()
+    # long polling returns as soon as an update arrives, so there is no pause between polls
+    controller.start_bot(poll_interval=0, timeout=30, user_ids=preloaded_user_ids, profile=profile, webhook=webhook)
 
 
 if __name__ == "__main__":